@@ -12,12 +12,19 @@ from transformers import AutoTokenizer
 import os
 import re
 import random
+import hashlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_random_exponential, stop_after_delay,
 )
-from utils import get_openai_batch_reply, print_intermediate_output,  run_thread_pool_sub, split_list_of_docs, thread_function
+from utils import get_openai_batch_reply, print_intermediate_output,  run_thread_pool_sub, segment_token_lengths, split_list_of_docs, thread_function
+
+# chunk_docs results by (doc hash, chunk_size, separator, chunk_overlap, tokenizer)
+CHUNK_CACHE_SIZE = 128
+_chunk_cache = OrderedDict()
 
 
 class Generator:
@@ -56,6 +63,8 @@ class Generator:
             self.tokenizer = AutoTokenizer.from_pretrained(
             config['llm']['name_or_path'])
         
+        self.chunk_header_lengths = {}
+        self.tokenizer_name = getattr(self.tokenizer, 'name_or_path', None) or getattr(self.tokenizer, 'name', None)
         self.print_intermediate_path = print_intermediate_path
         self.doc_id = doc_id
         
@@ -151,27 +160,30 @@ class Generator:
         # Split by punctuation and keep punctuation
         # Rearrange sentences and punctuation
         sentences = self.split_sentences(text, spliter)
+        # Tokenize once, chunks are measured by running sums of the sentence lengths
+        sentence_lengths = self.get_segment_lengths(sentences)
 
         chunks = []
         current_chunk = ""
+        current_length = 0
 
-        for s_idx, sentence in enumerate(sentences):
-            sentence_length = self.get_prompt_length(sentence)
-
-            if self.get_prompt_length(current_chunk) + sentence_length <= chunk_size:
+        for sentence, sentence_length in zip(sentences, sentence_lengths):
+            if current_length + sentence_length <= chunk_size:
                 current_chunk += sentence
+                current_length += sentence_length
             else:
                 if current_chunk:
-                    if self.get_prompt_length(current_chunk) <= chunk_size:
+                    if current_length <= chunk_size:
                         chunks.append(current_chunk)
                     else:
                         if spliter != ' ':  # Avoid infinite loops
                             chunks.extend(self.split_into_chunks(
                                 current_chunk, chunk_size=chunk_size, spliter=' '))
                 current_chunk = sentence
+                current_length = sentence_length
 
         if current_chunk != '':
-            if self.get_prompt_length(current_chunk) <= chunk_size:
+            if current_length <= chunk_size:
                 chunks.append(current_chunk)
             else:
                 if spliter != ' ':  # Avoid infinite loops
@@ -179,28 +191,33 @@ class Generator:
                         current_chunk, chunk_size=chunk_size, spliter=' '))
         # Re-segment the last two blocks
         
-        if len(chunks) > 1 and self.get_prompt_length(chunks[-1]) < chunk_size//2:
+        if len(chunks) > 1 and self.get_prompt_length_no_special(chunks[-1]) < chunk_size//2:
             last_chunk = chunks.pop()
             penultimate_chunk = chunks.pop()
             combined_text = penultimate_chunk + last_chunk
 
             new_sentences = self.split_sentences(combined_text, spliter)
+            new_lengths = self.get_segment_lengths(new_sentences)
 
             # Reallocate sentence using double pointer
             new_penultimate_chunk = ""
             new_last_chunk = ""
+            penultimate_length = 0
+            last_length = 0
             i, j = 0, len(new_sentences) - 1
 
             while i <= j and len(new_sentences) != 1:
                 flag = False
-                if self.get_prompt_length(new_penultimate_chunk + new_sentences[i]) <= chunk_size:
+                if penultimate_length + new_lengths[i] <= chunk_size:
                     flag = True
                     new_penultimate_chunk += new_sentences[i]
+                    penultimate_length += new_lengths[i]
                     if i == j:
                         break  
                     i += 1
-                if self.get_prompt_length(new_last_chunk + new_sentences[j]) <= chunk_size:
+                if last_length + new_lengths[j] <= chunk_size:
                     new_last_chunk = new_sentences[j] + new_last_chunk
+                    last_length += new_lengths[j]
                     j -= 1
                     flag = True
                 if flag == False:
@@ -211,11 +228,13 @@ class Generator:
                 if remaining_sentences:
                     remaining_text = "".join(remaining_sentences)
                     words = remaining_text.split(' ')
+                    word_lengths = self.get_segment_lengths([' ' + w for w in words])
                     end_index = len(words)-1
                     for index, w in enumerate(words):
-                        if self.get_prompt_length(' '.join([new_penultimate_chunk, w])) <= chunk_size:
+                        if penultimate_length + word_lengths[index] <= chunk_size:
                             new_penultimate_chunk = ' '.join(
                                 [new_penultimate_chunk, w])
+                            penultimate_length += word_lengths[index]
                         else:
                             end_index = index
                             break
@@ -238,15 +257,28 @@ class Generator:
             self.gen_args.get('max_tokens', 300)
         if question != None:
             chunk_size = chunk_size - self.get_prompt_length(question)
-        splits = doc.split(separator)
-        splits = [s for s in splits if s != '']
+
+        cache_key = (hashlib.sha1(doc.encode('utf-8')).hexdigest(), chunk_size,
+                     separator, chunk_overlap, self.tokenizer_name)
+        if cache_key in _chunk_cache:
+            _chunk_cache.move_to_end(cache_key)
+            return list(_chunk_cache[cache_key])
+
+        # Tokenize the doc once, separators included, and keep the length of every split
+        segments = []
+        for index, piece in enumerate(doc.split(separator)):
+            if index > 0:
+                segments.append(separator)
+            segments.append(piece)
+        segment_lengths = self.get_segment_lengths(segments)
+        splits = [(s, _len) for s, _len in zip(segments[0::2], segment_lengths[0::2]) if s != '']
         separator_len = self.get_prompt_length_no_special(separator)
 
         docs = []
         current_doc: List[str] = []
+        current_lens: List[int] = []
         total = 0
-        for d in splits:
-            _len = self.get_prompt_length_no_special(d)
+        for d, _len in splits:
             if (
                 total + _len + (separator_len if len(current_doc) > 0 else 0)
                 > chunk_size
@@ -264,6 +296,7 @@ class Generator:
                             current_doc[0], chunk_size)
                         docs.extend(split_again)
                         current_doc = []
+                        current_lens = []
                         total = 0
 
                 if len(current_doc) > 0:
@@ -279,15 +312,17 @@ class Generator:
                         > chunk_size
                         and total > 0
                     ):
-                        total -= self.get_prompt_length_no_special(current_doc[0]) + (
+                        total -= current_lens[0] + (
                             separator_len if len(current_doc) > 1 else 0
                         )
                         current_doc = current_doc[1:]
+                        current_lens = current_lens[1:]
 
             current_doc.append(d)
+            current_lens.append(_len)
             total += _len + (separator_len if len(current_doc) > 1 else 0)
         # Check if the last one exceeds
-        if self.get_prompt_length_no_special(current_doc[-1]) > chunk_size and len(current_doc) == 1:
+        if current_lens[-1] > chunk_size and len(current_doc) == 1:
             split_again = self.split_into_chunks(current_doc[0], chunk_size)
             docs.extend(split_again)
             current_doc = []
@@ -296,18 +331,20 @@ class Generator:
             if doc is not None:
                 docs.append(doc)
         docs = [d for d in docs if d.strip() != ""]
-        return docs
+
+        _chunk_cache[cache_key] = docs
+        if len(_chunk_cache) > CHUNK_CACHE_SIZE:
+            _chunk_cache.popitem(last=False)
+        return list(docs)
 
     def get_prompt_length(self, prompt, **kwargs: Any) -> int:
         if isinstance(prompt, list):
             prompt = self.join_docs(prompt)
         return len(self.tokenizer.encode(prompt, **kwargs))
 
-    def get_prompt_length_format(self, prompt, **kwargs: Any) -> int:
-        # Calculate the length after formatting
-        if isinstance(prompt, list):
-            prompt = ''.join(self.format_chunk_information(prompt))
-        return len(self.tokenizer.encode(prompt, **kwargs))
+    def get_segment_lengths(self, segments: list[str]) -> list[int]:
+        # Lengths without special tokens, like get_prompt_length_no_special
+        return segment_token_lengths(segments, self.tokenizer)
 
     def get_prompt_length_no_special(self, prompt, **kwargs: Any) -> int:
         if isinstance(prompt, list):
@@ -322,16 +359,32 @@ class Generator:
             return docs
         return '\n\n'.join(docs)
 
-    def format_chunk_information(self, docs):
+    def chunk_header(self, index):
         if self.config.get('zh_chunk', False) == False:
-        # format chunk
-            new_docs = [
-                f'Information of Chunk {index}:\n{d}\n' for index, d in enumerate(docs)]
-            return new_docs
+            return f'Information of Chunk {index}:\n'
         else:
-            new_docs = [
-                f'第{index}号块的信息:\n{d}\n' for index, d in enumerate(docs)]
-            return new_docs
+            return f'第{index}号块的信息:\n'
+
+    def format_chunk_information(self, docs):
+        # format chunk
+        new_docs = [
+            f'{self.chunk_header(index)}{d}\n' for index, d in enumerate(docs)]
+        return new_docs
+
+    def get_chunk_header_length(self, index):
+        if index not in self.chunk_header_lengths:
+            self.chunk_header_lengths[index] = self.get_prompt_length_no_special(
+                self.chunk_header(index))
+        return self.chunk_header_lengths[index]
+
+    def get_format_doc_lengths(self, docs):
+        # Length of every doc formatted by format_chunk_information, its header aside
+        return self.get_segment_lengths([f'{d}\n' for d in docs])
+
+    def get_format_length(self, doc_lengths, base_length):
+        # Length of the docs formatted by format_chunk_information, base_length being the special tokens
+        return base_length + sum(doc_lengths) + sum(
+            self.get_chunk_header_length(index) for index in range(len(doc_lengths)))
 
     def mr_collapse(
         self,
@@ -343,14 +396,18 @@ class Generator:
         result_docs = docs
 
         prompt = self.config['collapse_prompt']
-        num_tokens = self.get_prompt_length_format(result_docs)
+        # every doc is measured once, groups and totals are sums of its length and chunk header
+        base_length = self.get_prompt_length('')
+        doc_lengths = self.get_format_doc_lengths(result_docs)
+        num_tokens = self.get_format_length(doc_lengths, base_length)
         prompt_len = self.get_prompt_length(prompt)
         _token_max = token_max - prompt_len - \
             self.gen_args.get('max_tokens', 300)  # or self.chunk_size
         retries: int = 0
         while num_tokens is not None and num_tokens > _token_max:
             new_result_doc_list = split_list_of_docs(
-                result_docs, self.get_prompt_length_format, _token_max,
+                result_docs, doc_lengths, _token_max,
+                header_length_func=self.get_chunk_header_length, base_length=base_length,
             )
             result_docs = []
             current_batch = []
@@ -381,7 +438,8 @@ class Generator:
                 print_intermediate_output(
                     self.print_intermediate_path, intermediate_input, result_docs, 'collapse', doc_id=self.doc_id)
             #!---------
-            num_tokens = self.get_prompt_length_format(result_docs)
+            doc_lengths = self.get_format_doc_lengths(result_docs)
+            num_tokens = self.get_format_length(doc_lengths, base_length)
             retries += 1
             if max_retries and retries == max_retries:
                 raise ValueError(
@@ -392,6 +450,127 @@ class Generator:
         print(result_docs)
         return result_docs
 
+    def get_one_reply(self, messages):
+        # One request, the stream mode uses every reply as soon as it comes back
+        if self.use_openai_api:
+            para = copy.deepcopy(self.gen_args)
+            para['model'] = self.openai_model
+            return get_openai_batch_reply(
+                [messages], 1, self.openai_client, para)[0]
+        _, result = thread_function(self.url, 0, [messages], self.gen_args)
+        return result[0] if isinstance(result, list) else result
+
+    def mr_map_collapse_stream(
+        self,
+        context: list[str],
+        question: str,
+        token_max: int,
+        doc_filter=None,
+    ) -> list[str]:
+        '''
+        mr_map and mr_collapse as a streaming tree reduction. The outputs of every level (map is
+        level 0) are grouped in document order, like the rounds of mr_collapse: an output coming back
+        before the outputs of the chunks preceding it waits for them. A group of contiguous outputs
+        is collapsed into the next level as soon as the next output would not fit in the token
+        budget. When no call is running, what is left is collapsed again until it fits, like
+        mr_collapse. doc_filter(doc) == False drops an output on arrival, e.g. [NO INFORMATION].
+
+        Every map and collapse is a request of its own, served in one batch only by a server doing
+        continuous batching (INFER_TYPE=vLLM_async with use_openai_api false).
+        '''
+        map_prompt = self.config['map_prompt']
+        collapse_prompt = self.config['collapse_prompt']
+        _token_max = token_max - self.get_prompt_length(collapse_prompt) - \
+            self.gen_args.get('max_tokens', 300)
+        base_length = self.get_prompt_length('')
+        print("=====Map & Collapse (stream)=====")
+
+        # An output covers the chunks [start, end) of the context, the outputs of a level tile it.
+        # level: outputs waiting for a collapse as (start, doc, length), and the start of their group
+        buffers = defaultdict(list)
+        buffer_lengths = defaultdict(lambda: base_length)
+        group_starts = defaultdict(int)
+        # level: start of the next output in document order, outputs back before it by their start
+        cursors = defaultdict(int)
+        arrived = defaultdict(dict)
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_work_count) as executor:
+
+            def submit(operator, prompt, input_dict, level, start, end):
+                if self.use_openai_api:
+                    messages = [{'role': 'user', 'content': prompt.format_map(input_dict)}]
+                else:
+                    messages = self.build_message(prompt, input_dict)
+                future = executor.submit(self.get_one_reply, messages)
+                futures[future] = (operator, prompt.format_map(input_dict), level, start, end)
+
+            def submit_collapse(group, level, start, end):
+                docs = [doc for _, doc, _ in group]
+                submit('collapse', collapse_prompt,
+                       {"context": self.join_docs(docs), "question": question}, level, start, end)
+
+            def add_output(level, start, doc):
+                length = self.get_format_doc_lengths([doc])[0]
+                buffer = buffers[level]
+                next_length = buffer_lengths[level] + length + \
+                    self.get_chunk_header_length(len(buffer))
+                if buffer and next_length > _token_max:
+                    # the group ends where this output starts, dropped outputs in between included
+                    submit_collapse(buffer, level + 1, group_starts[level], start)
+                    group_starts[level] = start
+                    buffers[level] = []
+                    next_length = base_length + length + self.get_chunk_header_length(0)
+                buffers[level].append((start, doc, length))
+                buffer_lengths[level] = next_length
+
+            for position, item in enumerate(context):
+                submit('map', map_prompt, {"question": question, "context": item}, 0, position, position + 1)
+
+            while True:
+                if not futures:
+                    # every output is back, so every level is in order, the leftovers too
+                    leftovers = sorted(
+                        (item for buffer in buffers.values() for item in buffer),
+                        key=lambda item: item[0])
+                    buffers.clear()
+                    buffer_lengths.clear()
+                    lengths = [length for _, _, length in leftovers]
+                    if self.get_format_length(lengths, base_length) <= _token_max:
+                        break
+                    # a level above every level used so far, its outputs start from chunk 0 again
+                    top_level = max(cursors) + 1
+                    groups = split_list_of_docs(
+                        leftovers, lengths, _token_max,
+                        header_length_func=self.get_chunk_header_length, base_length=base_length,
+                    )
+                    starts = [0] + [group[0][0] for group in groups[1:]] + [len(context)]
+                    for index, group in enumerate(groups):
+                        submit_collapse(group, top_level, starts[index], starts[index + 1])
+                    continue
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    operator, intermediate_input, level, start, end = futures.pop(future)
+                    result = future.result()
+                    if self.print_intermediate_path != None:
+                        print_intermediate_output(
+                            self.print_intermediate_path, intermediate_input, result, operator, doc_id=self.doc_id)
+                    if doc_filter is not None and not doc_filter(result):
+                        result = None
+                    arrived[level][start] = (end, result)
+                    while cursors[level] in arrived[level]:
+                        start = cursors[level]
+                        end, result = arrived[level].pop(start)
+                        cursors[level] = end
+                        if result is not None:
+                            add_output(level, start, result)
+
+        result_docs = [doc for _, doc, _ in leftovers]
+        print("=====Collapse=====")
+        print(result_docs)
+        return result_docs
+
     def mr_reduce(self, context: list[str], question):
         # Reduce
         prompt = self.config['reduce_prompt']
@@ -0,0 +1,165 @@
+"""
+/infer on top of an async engine doing continuous batching (vllm.AsyncLLMEngine): every prompt of
+every request joins the running batch as soon as it arrives, instead of one llm.generate per request.
+
+Request:  {"instances": [prompt, ...], "params": {...}, "stream": false}
+Response: the list of outputs in the order of the instances, as the Flask servers return it. With
+"stream": true, one JSON line {"index": i, "output": ...} per instance, as soon as it finishes.
+An instance the engine gives no output for fails the request with a 500 {"error": ...}, or gets
+{"index": i, "error": ...} when streaming.
+
+The engine only needs `async generate(prompt, sampling_params, request_id)` yielding RequestOutputs
+and `async abort(request_id)`. FakeEngine serves on CPU without a model:
+    uvicorn --factory URLs.async_infer:create_fake_app --port 5002
+"""
+import asyncio
+import json
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def build_sampling_params(params, default_params, sampling_params_cls):
+    # a new dict per request, the params of one request never leak into another
+    sampling_params = dict(default_params)
+    for key, value in params.items():
+        if key in sampling_params:
+            sampling_params[key] = value
+    return sampling_params_cls(**sampling_params)
+
+
+def format_output(output, params):
+    if params.get("prompt_logprobs") is not None:
+        logp_list = []
+        for d in output.prompt_logprobs[1:]:
+            logprob = list(d.values())[0]
+            logp_list.append(getattr(logprob, "logprob", logprob))
+        return logp_list
+    return output.outputs[0].text
+
+
+class EmptyOutputError(Exception):
+    pass
+
+
+async def generate_one(engine, prompt, sampling_params, params):
+    request_id = uuid.uuid4().hex
+    final_output = None
+    try:
+        async for output in engine.generate(prompt, sampling_params, request_id):
+            final_output = output
+    except asyncio.CancelledError:
+        # the client went away, free the slot in the running batch
+        await engine.abort(request_id)
+        raise
+    if final_output is None:
+        # e.g. the request was aborted by the engine
+        raise EmptyOutputError(f"engine returned no output for request {request_id}")
+    return format_output(final_output, params)
+
+
+def create_app(engine, sampling_params_cls, default_params):
+    app = FastAPI()
+
+    @app.post("/infer")
+    async def infer(request: Request):
+        datas = await request.json()
+        params = datas.get("params", {})
+        prompts = datas["instances"]
+        sampling_params = build_sampling_params(params, default_params, sampling_params_cls)
+        tasks = [
+            asyncio.ensure_future(generate_one(engine, prompt, sampling_params, params))
+            for prompt in prompts
+        ]
+
+        if not datas.get("stream", False):
+            try:
+                return JSONResponse(await asyncio.gather(*tasks))
+            except EmptyOutputError as e:
+                for task in tasks:
+                    task.cancel()
+                return JSONResponse({"error": str(e)}, status_code=500)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+        async def stream_outputs():
+            index_of = {task: i for i, task in enumerate(tasks)}
+            pending = set(tasks)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        try:
+                            line = {"index": index_of[task], "output": task.result()}
+                        except EmptyOutputError as e:
+                            # the status is already sent, the error goes in the line of the instance
+                            line = {"index": index_of[task], "error": str(e)}
+                        yield json.dumps(line, ensure_ascii=False) + "\n"
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        return StreamingResponse(stream_outputs(), media_type="application/x-ndjson")
+
+    return app
+
+
+class FakeSamplingParams:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeEngine:
+    """
+    Stand-in for AsyncLLMEngine: every running request gets one token per step, like continuous
+    batching, the output echoes the end of the prompt. max_batch_size bounds the running requests.
+    """
+
+    class _Completion:
+        def __init__(self, text):
+            self.text = text
+
+    class _Output:
+        def __init__(self, request_id, text, prompt_logprobs, finished):
+            self.request_id = request_id
+            self.outputs = [FakeEngine._Completion(text)]
+            self.prompt_logprobs = prompt_logprobs
+            self.finished = finished
+
+    def __init__(self, step_time=0.01, max_batch_size=256):
+        self.step_time = step_time
+        self.slots = asyncio.Semaphore(max_batch_size)
+        self.aborted = set()
+        self.running = 0
+        self.max_running = 0
+
+    async def generate(self, prompt, sampling_params, request_id):
+        async with self.slots:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            try:
+                words = str(prompt).split()
+                prompt_logprobs = None
+                if getattr(sampling_params, "prompt_logprobs", None) is not None:
+                    prompt_logprobs = [None] + [{i: -1.0} for i in range(1, len(words))]
+                max_tokens = getattr(sampling_params, "max_tokens", 16)
+                text = ""
+                for i in range(max_tokens):
+                    await asyncio.sleep(self.step_time)
+                    if request_id in self.aborted:
+                        return
+                    text += f"{words[i % len(words)] if words else ''} "
+                    yield self._Output(request_id, text, prompt_logprobs, i == max_tokens - 1)
+            finally:
+                self.running -= 1
+
+    async def abort(self, request_id):
+        self.aborted.add(request_id)
+
+
+def create_fake_app():
+    default_params = {"temperature": 0.7, "max_tokens": 16, "prompt_logprobs": None}
+    return create_app(FakeEngine(), FakeSamplingParams, default_params)
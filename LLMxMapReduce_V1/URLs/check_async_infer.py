@@ -0,0 +1,70 @@
+"""
+Check of the async /infer on FakeEngine, no GPU or model needed: concurrent requests with their own
+params must be batched together by the engine, and every response must keep the order of its instances.
+
+Usage (from LLMxMapReduce_V1, needs fastapi and httpx): python -m URLs.check_async_infer --requests 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from URLs.async_infer import FakeEngine, FakeSamplingParams, create_app
+
+
+async def check(request_num, instance_num, step_time):
+    engine = FakeEngine(step_time=step_time)
+    app = create_app(engine, FakeSamplingParams, {"temperature": 0.7, "max_tokens": 16, "prompt_logprobs": None})
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/infer", json={
+                "instances": [f"r{i}_p{j} word" for j in range(instance_num)],
+                "params": {"max_tokens": 4 + i % 5},
+            })
+            for i in range(request_num)
+        ])
+        elapsed = time.perf_counter() - start
+
+        for i, response in enumerate(responses):
+            assert response.status_code == 200, f"request {i}: {response.status_code} {response.text}"
+            outputs = response.json()
+            assert len(outputs) == instance_num, f"request {i}: {len(outputs)} outputs"
+            for j, output in enumerate(outputs):
+                words = output.split()
+                assert words[0] == f"r{i}_p{j}", f"request {i}: output {j} is {output!r}"
+                assert len(words) == 4 + i % 5, f"request {i}: max_tokens not applied, {output!r}"
+        # one request alone never runs more than instance_num prompts at once
+        assert engine.max_running > instance_num, f"no batching across requests, max_running {engine.max_running}"
+
+        response = await client.post("/infer", json={
+            "instances": [f"s{j} word" for j in range(instance_num)],
+            "params": {"max_tokens": 3},
+            "stream": True,
+        })
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["index"] for line in lines) == list(range(instance_num)), lines
+        for line in lines:
+            assert line["output"].split()[0] == f"s{line['index']}", line
+
+    sequential = request_num * (4 + 2) * step_time
+    print(
+        f"{request_num} requests x {instance_num} instances in {elapsed:.2f}s "
+        f"(about {sequential:.2f}s one request after another), max running {engine.max_running}: OK"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--instances", type=int, default=4, help="instances per request")
+    parser.add_argument("--step_time", type=float, default=0.01, help="seconds per generated token")
+    args = parser.parse_args()
+    asyncio.run(check(args.requests, args.instances, args.step_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,9 +12,13 @@ infer_type = os.environ.get('INFER_TYPE')
 bind = '127.0.0.1:' + port
 workers = gdp.workers_num()
 
-# determine deploy type, currently support 'vLLM' and 'transformers'
+# determine deploy type, currently support 'vLLM', 'vLLM_async' and 'transformers'
 if infer_type == "vLLM":
     wsgi_app = 'URLs.vllm_url_m:app'
+elif infer_type == "vLLM_async":
+    # ASGI app with continuous batching, served by uvicorn workers
+    wsgi_app = 'URLs.vllm_async_url_m:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
 elif infer_type == "transformers":
     wsgi_app = 'URLs.transformers_url_m:app'
 
@@ -5,7 +5,7 @@ HF_MODEL_NAME="your/model/path"
 PER_PROC_GPUS=1 # The number of GPUs occupied by each child process. By default, all are occupied, and it is a single process. This value must be divisible by the total number of available GPUs in the POD. The number of workers = the total number of GPUs / this value
 CUDA_VISIBLE_DEVICES="0,1,2,6"
 PORT=5002 # Default port
-INFER_TYPE="vLLM" # The default inference type is "vLLM" or "transformers". The latter uses transformers for model deployment inference.
+INFER_TYPE="vLLM" # The default inference type is "vLLM", "vLLM_async" or "transformers". "vLLM_async" batches the prompts of concurrent requests continuously, the latter uses transformers for model deployment inference.
 QUANTIZATION=awq
 TIMEOUT=6000 # Default timeout
 MAX_MODEL_LEN=None # The maximum length of the model
@@ -40,16 +40,18 @@ def main():
     params = datas["params"]
     prompt = datas["instances"]
 
+    # a copy per request, concurrent requests must not see each other's params
+    generate_params = dict(params_dict)
     for key, value in params.items():
         if key == "max_tokens":
-            params_dict["max_new_tokens"] = value
-        elif key in params_dict:
-            params_dict[key] = value
+            generate_params["max_new_tokens"] = value
+        elif key in generate_params:
+            generate_params[key] = value
     if prompt == "":
         return jsonify({'error': 'No prompt provided'}), 400
     
     inputs = tokenizer(prompt, padding=True, return_tensors="pt").to(device)  # Prepare the input tensor
-    generate_ids = model.generate(inputs.input_ids, attention_mask=inputs.attention_mask, **params_dict)
+    generate_ids = model.generate(inputs.input_ids, attention_mask=inputs.attention_mask, **generate_params)
 
     # Decoding the generated ids to text
     generated_text = tokenizer.batch_decode(generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
@@ -0,0 +1,56 @@
+import os
+
+from vllm import AsyncEngineArgs, AsyncLLMEngine, SamplingParams
+
+from URLs.async_infer import create_app
+from URLs.dispatcher import GPUDispatcher as gdp
+
+gdp.bind_worker_gpus()
+
+"""
+Same /infer as vllm_url_m.py, served by AsyncLLMEngine with continuous batching, see URLs/async_infer.py.
+Run with INFER_TYPE=vLLM_async in start_gunicorn.sh, every worker is a uvicorn worker.
+reference:https://github.com/vllm-project/vllm/blob/main/vllm/sampling_params.py
+"""
+
+model_name = os.environ.get("HF_MODEL_NAME")
+per_proc_gpus = int(os.environ.get("PER_PROC_GPUS"))
+quantization = os.environ.get("QUANTIZATION")
+if quantization == 'None' or quantization == None:
+    quantization = None
+print('Load Model')
+print(f"model_name:{model_name}, per_proc_gpus:{per_proc_gpus}")
+max_model_len = os.environ.get("MAX_MODEL_LEN")
+if max_model_len == 'None' or max_model_len == None:
+    max_model_len = None
+else:
+    max_model_len = int(max_model_len)
+
+engine_args = AsyncEngineArgs(model=model_name, trust_remote_code=True,
+                              tensor_parallel_size=per_proc_gpus, quantization=quantization, enforce_eager=True,
+                              gpu_memory_utilization=1, max_model_len=max_model_len)
+engine = AsyncLLMEngine.from_engine_args(engine_args)
+# Model parameters, the defaults of every request
+params_dict = {
+    "n": 1,
+    "best_of": 1,
+    "presence_penalty": 0.0,
+    "frequency_penalty": 0.0,
+    "temperature": 0.7,
+    "top_p": 1.0,
+    "top_k": -1,
+    "use_beam_search": False,
+    "length_penalty": 1.0,
+    "early_stopping": False,
+    "stop": None,
+    "stop_token_ids": None,
+    "ignore_eos": False,
+    "max_tokens": 1000,
+    "logprobs": None,
+    "prompt_logprobs": None,
+    "skip_special_tokens": True,
+}
+
+print("model load finished")
+
+app = create_app(engine, SamplingParams, params_dict)
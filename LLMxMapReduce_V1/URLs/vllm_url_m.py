@@ -60,11 +60,13 @@ def main():
     params = datas["params"]
     prompts = datas["instances"]
 
+    # a copy per request, concurrent requests must not see each other's params
+    sampling_params = dict(params_dict)
     for key, value in params.items():
-        if key in params_dict:
-            params_dict[key] = value
+        if key in sampling_params:
+            sampling_params[key] = value
 
-    outputs = llm.generate(prompts, SamplingParams(**params_dict))
+    outputs = llm.generate(prompts, SamplingParams(**sampling_params))
 
     res = []
     if "prompt_logprobs" in params and params["prompt_logprobs"] is not None:
@@ -6,6 +6,8 @@ class BasePipeline:
 
         self.generator = Generator(
             config, print_intermediate_path=print_intermediate_path, doc_id=doc_id)
+        # overlap map and collapse, see Generator.mr_map_collapse_stream
+        self.streaming_collapse = config.get('streaming_collapse', False)
         
     def remove_chunk(self, chunks: list, irrelevant_note=['[NOT MENTIONED]'], question=''):
         # Remove the element corresponding to index in chunk
@@ -31,6 +33,13 @@ class BasePipeline:
         split_docs = self.generator.chunk_docs(doc, chunk_size,question=question)
         contexts = split_docs
 
+        if self.streaming_collapse:
+            collapse_result = self.generator.mr_map_collapse_stream(
+                split_docs, question, token_max=chunk_size,
+                doc_filter=lambda doc: self.remove_chunk(
+                    [doc], question=question, irrelevant_note=['[NO INFORMATION]']))
+            return self.generator.mr_reduce(collapse_result, question)
+
         map_result = self.generator.mr_map(split_docs,  question)
         map_result = self.remove_chunk(
             map_result, question=question, irrelevant_note=['[NO INFORMATION]'])
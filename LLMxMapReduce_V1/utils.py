@@ -3,11 +3,12 @@ import json
 import time
 import traceback
 import concurrent
+from bisect import bisect_left
 import requests
 from tqdm import tqdm
 from vllm import LLM, SamplingParams
 import os
-from typing import Any, Callable, List
+from typing import Any, Callable, List, Optional
 
 import openai
 import tiktoken
@@ -59,25 +60,36 @@ def read_yaml(file_path):
 
 
 def split_list_of_docs(
-    docs: List[str], length_func: Callable, token_max: int, **kwargs: Any
+    docs: List[str],
+    doc_lengths: List[int],
+    token_max: int,
+    header_length_func: Optional[Callable[[int], int]] = None,
+    base_length: int = 0,
 ) -> List[List[str]]:
     """Split Documents into subsets that each meet a cumulative length constraint.
 
+    The length of a subset is base_length plus, for the Document at position i of the subset,
+    its length and header_length_func(i), so the Documents are measured once and split in one pass.
+
     Args:
         docs: The full list of Documents.
-        length_func: Function for computing the cumulative length of a set of Documents.
+        doc_lengths: The length of every Document.
         token_max: The maximum cumulative length of any subset of Documents.
-        **kwargs: Arbitrary additional keyword params to pass to each call of the
-            length_func.
+        header_length_func: Length added to the Document at a position of its subset, e.g. the
+            chunk header of format_chunk_information.
+        base_length: Length of an empty subset, e.g. the special tokens.
 
     Returns:
         A List[List[Document]].
     """
     new_result_doc_list = []
     _sub_result_docs = []
-    for doc in docs:
+    _num_tokens = base_length
+    for doc, doc_length in zip(docs, doc_lengths):
         _sub_result_docs.append(doc)
-        _num_tokens = length_func(_sub_result_docs, **kwargs)
+        _num_tokens += doc_length
+        if header_length_func is not None:
+            _num_tokens += header_length_func(len(_sub_result_docs) - 1)
         if _num_tokens > token_max:
             if len(_sub_result_docs) == 1:
                 raise ValueError(
@@ -86,10 +98,46 @@ def split_list_of_docs(
                 )
             new_result_doc_list.append(_sub_result_docs[:-1])
             _sub_result_docs = _sub_result_docs[-1:]
+            _num_tokens = base_length + doc_length
+            if header_length_func is not None:
+                _num_tokens += header_length_func(0)
     new_result_doc_list.append(_sub_result_docs)
     return new_result_doc_list
 
 
+def segment_token_lengths(segments: List[str], tokenizer) -> List[int]:
+    """Token length of every segment of ''.join(segments), without special tokens.
+
+    HF fast tokenizers encode the joined text once and count the tokens starting in each
+    segment through the offset mapping, a token across two segments counts for the first.
+    tiktoken encodes the segments in one batch, slow HF tokenizers one by one.
+
+    Args:
+        segments: Consecutive pieces of a text.
+        tokenizer: tiktoken Encoding or HF tokenizer.
+
+    Returns:
+        A List[int] of the same length as segments.
+    """
+    if isinstance(tokenizer, tiktoken.core.Encoding):
+        return [len(tokens) for tokens in tokenizer.encode_batch(segments, disallowed_special='all')]
+    if not getattr(tokenizer, 'is_fast', False):
+        return [len(tokenizer.encode(segment, add_special_tokens=False)) for segment in segments]
+
+    offsets = tokenizer(''.join(segments), add_special_tokens=False,
+                        return_offsets_mapping=True)['offset_mapping']
+    starts = [start for start, _ in offsets]
+    lengths = []
+    segment_end = 0
+    first_token = 0
+    for segment in segments:
+        segment_end += len(segment)
+        next_token = bisect_left(starts, segment_end, lo=first_token)
+        lengths.append(next_token - first_token)
+        first_token = next_token
+    return lengths
+
+
 data_prompt = {
     "params": {},
     "instances": [],
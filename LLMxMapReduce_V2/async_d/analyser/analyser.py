@@ -13,3 +13,7 @@ class Analyser(metaclass=SingletonMeta):
 
     def report(self) -> str:
         raise NotImplementedError("Subclasses should implement this method")
+
+    def metrics(self) -> list:
+        """MetricFamily list exported by the Monitor, nothing by default."""
+        return []
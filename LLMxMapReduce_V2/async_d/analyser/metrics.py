@@ -0,0 +1,105 @@
+import math
+
+
+class LatencyHistogram:
+    # upper bounds in seconds
+    BUCKETS = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+        1, 2.5, 5, 10, 30, 60, 120, 300, 600, math.inf,
+    )
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        return estimate_quantile(self.BUCKETS, self.counts, q)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.BUCKETS, self.counts)},
+        }
+
+
+def estimate_quantile(buckets, counts, q):
+    """Estimate the q-quantile by linear interpolation inside the bucket holding it."""
+    total = sum(counts)
+    if total == 0:
+        return math.nan
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and cumulative + count >= rank:
+            if math.isinf(bound):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+    return str(value)
+
+
+class MetricFamily:
+    """One metric family in the Prometheus text exposition format."""
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.samples = []
+
+    def add(self, labels, value, suffix=""):
+        self.samples.append((self.name + suffix, labels, value))
+
+    def add_histogram(self, labels, buckets, counts, total_sum, quantiles=(0.5, 0.95, 0.99)):
+        """
+        Histograms are exposed as summaries: quantiles estimated from the buckets, plus _sum and _count,
+        which is what we look at to find the slow node, without a bucket series per label.
+        """
+        for q in quantiles:
+            self.add({**labels, "quantile": str(q)}, estimate_quantile(buckets, counts, q))
+        self.add(labels, total_sum, "_sum")
+        self.add(labels, sum(counts), "_count")
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for name, labels, value in self.samples:
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+def render_families(families):
+    return "\n".join(family.render() for family in families if family.samples)
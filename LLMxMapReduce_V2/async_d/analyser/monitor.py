@@ -1,38 +1,104 @@
+import os
 import time
 import threading
 import logging
 from datetime import timedelta
 
 from .analyser import Analyser
+from .metrics import MetricFamily, render_families
 from .singleton_meta import SingletonMeta
 
 logger = logging.getLogger(__name__)
 
 
 class Monitor(metaclass=SingletonMeta):
-    def __init__(self, report_interval=10) -> None:
+    """
+    Log the report of every registered analyser each report_interval seconds.
+
+    The analysers' metrics can also be exposed in the Prometheus text format, either served
+    over HTTP on metrics_port (GET /metrics) or written to metrics_textfile every interval for
+    the node_exporter textfile collector.
+    """
+
+    def __init__(self, report_interval=10, metrics_port=None, metrics_textfile=None) -> None:
         self.registered_analysers = []
         self.start_time = None
         self.report_interval = report_interval
+        self.metrics_port = metrics_port
+        self.metrics_textfile = metrics_textfile
+        self.metrics_server = None
+        self._stop_event = threading.Event()
 
     def start(self):
         for analyser in self.registered_analysers:
             analyser.start()
-        self.thread = threading.Thread(target=self.get_all_info)
-        self.thread.start()
         self.start_time = time.time()
+        if self.metrics_port is not None:
+            self.start_metrics_server(self.metrics_port)
+        self.thread = threading.Thread(target=self.get_all_info, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.metrics_textfile is not None:
+            self.write_metrics_textfile(self.metrics_textfile)
 
     def get_all_info(self):
-        while True:
-            time.sleep(self.report_interval)
+        while not self._stop_event.wait(self.report_interval):
             total_time = time.time() - self.start_time
             readable_time = str(timedelta(seconds=total_time))
             logger.info("=" * 80 + f"\nTotal execution time: {readable_time}")
             for analyser in self.registered_analysers:
                 string = analyser.report()
                 logger.info("=" * 80 + "\n" + string)
+            if self.metrics_textfile is not None:
+                self.write_metrics_textfile(self.metrics_textfile)
 
     def register(self, *analysers):
         for analyser in analysers:
             assert isinstance(analyser, Analyser)
             self.registered_analysers.append(analyser)
+
+    def render_metrics(self) -> str:
+        uptime = MetricFamily("async_d_uptime_seconds", "gauge", "Seconds since the monitor started")
+        uptime.add({}, time.time() - self.start_time if self.start_time else 0.0)
+        families = [uptime]
+        for analyser in self.registered_analysers:
+            try:
+                families.extend(analyser.metrics())
+            except Exception as e:
+                logger.warning(f"Failed to collect metrics of {type(analyser).__name__}: {e}")
+        return render_families(families) + "\n"
+
+    def write_metrics_textfile(self, path):
+        # atomic replace, the collector must never read a half written file
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.render_metrics())
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.warning(f"Failed to write metrics to {path}: {e}")
+
+    def start_metrics_server(self, port, host="0.0.0.0"):
+        from gevent.pywsgi import WSGIServer
+
+        def application(environ, start_response):
+            if environ.get("PATH_INFO", "/") not in ("/", "/metrics"):
+                start_response("404 Not Found", [("Content-Type", "text/plain")])
+                return [b"Not Found"]
+            body = self.render_metrics().encode("utf-8")
+            start_response(
+                "200 OK",
+                [
+                    ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+                    ("Content-Length", str(len(body))),
+                ],
+            )
+            return [body]
+
+        self.metrics_server = WSGIServer((host, port), application, log=None)
+        self.metrics_server.start()
+        logger.info(f"Metrics server listening on http://{host}:{port}/metrics")
@@ -6,6 +6,7 @@ from collections import defaultdict
 from tabulate import tabulate
 
 from .analyser import Analyser
+from .metrics import LatencyHistogram, MetricFamily
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +20,14 @@ class PipelineAnalyser(Analyser):
             self.exec_time = 0
             self.interval_exec_count = 0
             self.interval_exec_time = 0
+            self.histogram = LatencyHistogram()
 
     def __init__(self):
         self.node_group = None
         self.node_executing_count = {}
         self.func_info = {}
         self.func_lock = defaultdict(Semaphore)
+        self.usage_tracker = None
 
     def start(self):
         from ..node import Node
@@ -53,6 +56,7 @@ class PipelineAnalyser(Analyser):
             with self.func_lock[func_name]:
                 func_info.interval_exec_time += exec_time
                 func_info.interval_exec_count += 1
+                func_info.histogram.observe(exec_time)
 
             return result
 
@@ -61,6 +65,63 @@ class PipelineAnalyser(Analyser):
     def register(self, node_group):
         self.node_group = node_group
 
+    def register_usage(self, usage_tracker):
+        """
+        usage_tracker: object whose snapshot() returns the usage counters by group, e.g. the
+        UsageTracker of request. async_d does not import request, so it is registered from outside.
+        """
+        self.usage_tracker = usage_tracker
+
+    def usage(self, group=None) -> dict:
+        """
+        Usage counters of the registered usage tracker, all of them or only one group
+        ("total", "model", "neuron" or "survey"), empty if no tracker is registered.
+        """
+        if self.usage_tracker is None:
+            return {}
+        snapshot = self.usage_tracker.snapshot()
+        return snapshot if group is None else snapshot.get(group, {})
+
+    def all_nodes(self):
+        from .. import Node
+
+        def iter_nodes(node_group):
+            for node in node_group.all_nodes.values():
+                if isinstance(node, Node):
+                    yield node
+                else:
+                    yield from iter_nodes(node)
+
+        return list(iter_nodes(self.node_group))
+
+    def metrics(self) -> list:
+        queue_size = MetricFamily("async_d_node_queue_size", "gauge", "Data waiting in the source queue of the node")
+        queue_capacity = MetricFamily("async_d_node_queue_capacity", "gauge", "Max size of the source queue of the node, 0 if unbounded")
+        executing = MetricFamily("async_d_node_executing", "gauge", "Data being processed by the node")
+        workers = MetricFamily("async_d_node_workers", "gauge", "Worker number of the node")
+        running = MetricFamily("async_d_node_running", "gauge", "1 if the node is running, 0 if finished")
+        processed = MetricFamily("async_d_node_processed_total", "counter", "Data processed by the node")
+        latency = MetricFamily("async_d_node_proc_seconds", "summary", "Latency of _proc_data of the node")
+
+        for node in self.all_nodes():
+            labels = {"node": node.__name__, "serial": "-".join(map(str, node.serial_number))}
+            queue_size.add(labels, node.src_queue.qsize())
+            queue_capacity.add(labels, node.src_queue.maxsize or 0)
+            executing.add(labels, len(node.executing_data))
+            workers.add(labels, node.worker_num)
+            running.add(labels, int(node.is_start))
+
+            info = self.func_info.get(node.__name__)
+            if info is None:
+                continue
+            with self.func_lock[node.__name__]:
+                histogram = info.histogram
+                counts, total_sum = list(histogram.counts), histogram.sum
+            processed.add(labels, sum(counts))
+            latency.add_histogram(labels, histogram.BUCKETS, counts, total_sum)
+
+        return [queue_size, queue_capacity, executing, workers, running, processed, latency]
+
     def report(self) -> str:
         from .. import Node
 
@@ -101,7 +162,7 @@ class PipelineAnalyser(Analyser):
                             "-".join(map(str, node.serial_number)),
                             name,
                             f"{node.src_queue.qsize()}/{node.src_queue.maxsize}",
-                            f"{len(node.executing_data_queue)}/{node.worker_num}",
+                            f"{len(node.executing_data)}/{node.worker_num}",
                             (
                                 f"{interval_exec_count}/{interval_exec_time:.2f}s, {interval_exec_count / interval_exec_time:.2f}/s"
                                 if interval_exec_time > 0
@@ -1,14 +1,16 @@
 import logging
+import itertools
 import traceback
 import functools
 from typing import Iterable
+from collections import deque
 
 import gevent
 import copy
 from gevent import sleep, spawn
 from gevent.queue import Queue
 from tenacity import (
-    retry,
+    Retrying,
     retry_if_not_exception_type,
     retry_if_exception_type,
     stop_after_attempt,
@@ -55,10 +57,11 @@ class Node(AbstractNode, NodeLink):
         self.is_start = False
 
         self.src_queue = Queue(self.queue_size)
+        # iterators of _get_one_data not exhausted yet, shared by the workers of the node
+        self.unpacking_iterators = deque()
         self.criterias = {}
         self.src_nodes = {}
         self.dst_nodes = {}
-        self.get_data_lock = gevent.lock.Semaphore(1)
 
         self.no_input = no_input
         self.no_output = no_output
@@ -74,7 +77,9 @@ class Node(AbstractNode, NodeLink):
         self._proc_data = self._error_decorator(proc_func)
 
         self.tasks = []  # store all worker tasks
-        self.executing_data_queue = []
+        # data being processed by the workers, by an id taken from _data_ids
+        self.executing_data = {}
+        self._data_ids = itertools.count()
 
     def start(self):
         """
@@ -168,12 +173,10 @@ class Node(AbstractNode, NodeLink):
         self.proc_decorators = new_decorators
 
     def _spawn_workers(self):
+        self.is_start = True
         for i in range(self.worker_num):
             task = spawn(self._func_wrapper, i)
             self.tasks.append(task)
-
-        self.get_data_generator = self._get_data()
-        self.is_start = True
         return self.tasks
 
     def _func_wrapper(self, task_id):
@@ -181,23 +184,30 @@ class Node(AbstractNode, NodeLink):
         Wraps the processing function and handles concurrency.
         """
         logger.debug(f"Name: {self.__name__}, id: {task_id} start")
+        # _get_one_data only has to run when it unpacks or has get decorators
+        get_data = (
+            self._next_unpacked_data
+            if self.is_data_iterable or self.get_decorators
+            else self.src_queue.get
+        )
         while self.is_start:
             data = None
+            data_id = None
             try:
                 if not self.no_input:
-                    with self.get_data_lock:
-                        data = next(self.get_data_generator)
+                    data = get_data()
                     if isinstance(data, NodeStop):
                         raise NodeStop()
-                    self.executing_data_queue.append(data)
+                    data_id = next(self._data_ids)
+                    self.executing_data[data_id] = data
                 result = self._proc_data(data)
                 self._put_data(result)
             except NodeStop:
                 logger.info(f"Node {self.__name__} No. {task_id} stop")
                 break
             finally:
-                if data in self.executing_data_queue:
-                    self.executing_data_queue.remove(data)
+                if data_id is not None:
+                    del self.executing_data[data_id]
             if task_id == 0 and self._is_upstream_end():
                 logger.info(f"Node {self.__name__} No. {task_id} upstream end")
                 self.end()
@@ -206,16 +216,30 @@ class Node(AbstractNode, NodeLink):
         if all(task.ready() for task in self.tasks if task != gevent.getcurrent()):
             logger.info(f"Node {self.__name__} No. {task_id} all other tasks finished")
             self.is_start = False
-            
-    def _get_data(self):
-        while self.is_start:
+
+    def _next_unpacked_data(self):
+        """
+        Next item of the oldest iterator of _get_one_data, so every idle worker takes items of the
+        same iterable without a lock. A worker with no iterator left to take from unpacks the next
+        data of the source queue itself.
+        """
+        while True:
+            if self.unpacking_iterators:
+                # taken out while it runs, a get decorator may switch greenlets inside next()
+                iterator = self.unpacking_iterators.popleft()
+                try:
+                    data = next(iterator)
+                except StopIteration:
+                    continue
+                self.unpacking_iterators.appendleft(iterator)
+                return data
             data = self.src_queue.get()
-            yield from self._get_one_data(data)
-        yield NodeStop()
+            self.unpacking_iterators.append(self._get_one_data(data))
 
     def _get_one_data(self, data):
         if isinstance(data, NodeStop):
             yield NodeStop()
+            return
         if self.is_data_iterable:
             assert isinstance(
                 data, Iterable
@@ -241,11 +265,14 @@ class Node(AbstractNode, NodeLink):
                     node.put(data)
 
     def _error_decorator(self, func):
-        @retry(
+        # one Retrying for all the workers of the node instead of the copy @retry makes per call:
+        # its state is kept in a threading.local, which the gevent monkey patch makes greenlet-local
+        retrying = Retrying(
             stop=stop_after_attempt(5),
             wait=wait_exponential_jitter(max=10),
             retry=retry_if_exception_type(Exception),
         )
+
         @functools.wraps(func)
         def input_wrapper(data):
             if self.no_input:
@@ -257,7 +284,7 @@ class Node(AbstractNode, NodeLink):
         @functools.wraps(func)
         def error_wrapper(data):
             try:
-                return input_wrapper(data)
+                return retrying(input_wrapper, data)
             except Exception as e:
                 logger.error(
                     f"{self.__name__} error: {e}, input_data: {data}"
@@ -3,7 +3,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from .openai import OpenAIRequest
+from .openai import OpenAIRequest, OpenAIPooledRequest
 from .local import LocalRequest
 from .wrapper import RequestWrapper
+from .rate_limiter import RateLimiter
 
@@ -0,0 +1,96 @@
+import logging
+from tabulate import tabulate
+
+from async_d import Analyser
+from async_d.analyser.metrics import MetricFamily
+from .wrapper import RequestWrapper
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class RequestAnalyser(Analyser):
+    def __init__(self):
+        pass
+
+    def start(self):
+        pass
+
+    def report(self) -> str:
+        string = "Request Report"
+        cache = RequestWrapper._cache
+        if cache is not None:
+            stats = cache.stats()
+            table = [
+                [
+                    stats["hit"],
+                    stats["miss"],
+                    f"{stats['hit_rate'] * 100:.1f}%",
+                    stats["memory_entries"],
+                ]
+            ]
+            headers = ["Cache Hit", "Cache Miss", "Hit Rate", "Memory Entries"]
+            string += "\n" + tabulate(table, headers, tablefmt="grid")
+        else:
+            string += "\nCache disabled"
+
+        table = []
+        for limiter in RateLimiter.all_limiters():
+            stats = limiter.stats()
+            table.append(
+                [
+                    limiter.model,
+                    f"{stats['concurrency']}/{stats['max_concurrency']}",
+                    stats["in_flight"],
+                    stats["waiting"],
+                    stats["throttled"],
+                ]
+            )
+        headers = ["Model", "Concurrency", "In Flight", "Waiting", "Throttled"]
+        string += "\n" + tabulate(table, headers, tablefmt="grid")
+
+        usage_tracker = RequestWrapper.usage_tracker()
+        string += "\n" + usage_tracker.report("model")
+        string += "\n" + usage_tracker.report("neuron")
+        return string
+
+    def metrics(self) -> list:
+        calls = MetricFamily("llm_requests_total", "counter", "Successful LLM completions")
+        errors = MetricFamily("llm_request_errors_total", "counter", "LLM completions that raised")
+        tokens = MetricFamily("llm_tokens_total", "counter", "Tokens used by LLM completions")
+        latency = MetricFamily("llm_request_seconds", "summary", "Latency of LLM completions")
+        usage_tracker = RequestWrapper.usage_tracker()
+        for model, stats in usage_tracker.snapshot()["model"].items():
+            labels = {"model": model}
+            calls.add(labels, stats["calls"])
+            errors.add(labels, stats["errors"])
+            tokens.add({**labels, "type": "prompt"}, stats["prompt_tokens"])
+            tokens.add({**labels, "type": "completion"}, stats["completion_tokens"])
+            latency.add_histogram(
+                labels,
+                [float(bound) for bound in stats["latency"]["buckets"]],
+                list(stats["latency"]["buckets"].values()),
+                stats["latency"]["sum"],
+            )
+
+        concurrency = MetricFamily("llm_limiter_concurrency", "gauge", "Current adaptive concurrency of the model")
+        in_flight = MetricFamily("llm_limiter_in_flight", "gauge", "LLM requests in flight")
+        waiting = MetricFamily("llm_limiter_waiting", "gauge", "LLM requests waiting for a slot")
+        throttled = MetricFamily("llm_limiter_throttled_total", "counter", "Rate limit responses from the provider")
+        for limiter in RateLimiter.all_limiters():
+            labels = {"model": limiter.model}
+            stats = limiter.stats()
+            concurrency.add(labels, stats["concurrency"])
+            in_flight.add(labels, stats["in_flight"])
+            waiting.add(labels, stats["waiting"])
+            throttled.add(labels, stats["throttled"])
+
+        families = [calls, errors, tokens, latency, concurrency, in_flight, waiting, throttled]
+        cache = RequestWrapper._cache
+        if cache is not None:
+            cache_lookups = MetricFamily("llm_cache_lookups_total", "counter", "LLM response cache lookups")
+            stats = cache.stats()
+            cache_lookups.add({"result": "hit"}, stats["hit"])
+            cache_lookups.add({"result": "miss"}, stats["miss"])
+            families.append(cache_lookups)
+        return families
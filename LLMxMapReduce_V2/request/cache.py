@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCache:
+    """
+    Content-addressed cache of LLM responses, shared by every RequestWrapper in the process.
+
+    Responses are keyed by (model, infer_type, normalized messages, sampling kwargs). A key
+    may hold several responses: identical prompts are issued on purpose (best-of-N sampling,
+    retries after a parse failure), so the n-th request for a key within one run replays the
+    n-th stored response and only goes to the model once the stored ones are used up.
+
+    Hot keys live in an in-memory LRU tier, everything is persisted in a sqlite file under
+    `cache_dir` so a resumed run can replay already-paid calls.
+    """
+
+    DB_NAME = "llm_cache.sqlite"
+
+    def __init__(self, cache_dir, max_memory_entries=4096):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, self.DB_NAME)
+        self.max_memory_entries = max_memory_entries
+
+        self._memory = OrderedDict()  # key: [response, ...]
+        self._served = {}  # key: count of responses consumed in this run
+        self._lock = Semaphore(1)
+        self.hit_count = 0
+        self.miss_count = 0
+
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT NOT NULL, idx INTEGER NOT NULL, response TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (key, idx))"
+        )
+        logger.info(f"LLM response cache enabled at {self.db_path}")
+
+    @staticmethod
+    def make_key(model, infer_type, messages, kwargs):
+        normalized_messages = [
+            {"role": m["role"], "content": m["content"].strip()} for m in messages
+        ]
+        payload = json.dumps(
+            {
+                "model": model,
+                "infer_type": infer_type,
+                "messages": normalized_messages,
+                "kwargs": kwargs,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            responses = self._load(key)
+            index = self._served.get(key, 0)
+            if index < len(responses):
+                self._served[key] = index + 1
+                self.hit_count += 1
+                return responses[index]
+            self.miss_count += 1
+            return None
+
+    def put(self, key, response):
+        with self._lock:
+            responses = self._load(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, idx, response, created) VALUES (?, ?, ?, ?)",
+                (key, len(responses), response, time.time()),
+            )
+            responses.append(response)
+            self._served[key] = self._served.get(key, 0) + 1
+
+    def _load(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        rows = self._conn.execute(
+            "SELECT response FROM responses WHERE key = ? ORDER BY idx", (key,)
+        ).fetchall()
+        responses = [row[0] for row in rows]
+        self._memory[key] = responses
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+        return responses
+
+    @property
+    def hit_rate(self):
+        total = self.hit_count + self.miss_count
+        return self.hit_count / total if total > 0 else 0.0
+
+    def stats(self):
+        return {
+            "hit": self.hit_count,
+            "miss": self.miss_count,
+            "hit_rate": self.hit_rate,
+            "memory_entries": len(self._memory),
+        }
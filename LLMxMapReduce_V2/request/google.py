@@ -3,12 +3,8 @@ import os
 import logging
 from google import genai
 from google.genai import types
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_random_exponential,
-    retry_if_exception_type
-)
+
+from .rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -22,17 +18,16 @@ logger = logging.getLogger(__name__)
 from google import genai
 
 class GoogleRequest:
+    # retried by RequestWrapper, so every attempt goes through the rate limiter again
+    RETRY_EXCEPTIONS = (Exception,)  # 网络、限流、服务端错误等都重试
+    MAX_ATTEMPTS = 10
+
     def __init__(self, model: str):
         self.client = genai.Client(
             api_key=os.environ.get("GOOGLE_API_KEY"),
             )
         self.model = model
 
-    @retry(
-        wait=wait_random_exponential(multiplier=2, max=60),
-        stop=stop_after_attempt(10),
-        retry=retry_if_exception_type(Exception)  # 网络、限流、服务端错误等都重试
-    )
     def completion(self, messages, **kwargs) -> str:
 
         contents = [
@@ -40,10 +35,15 @@ class GoogleRequest:
             for m in messages
         ]
             
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=contents
-        )
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=contents
+            )
+        except Exception as e:
+            if getattr(e, "code", None) == 429:
+                RateLimiter.get(self.model).on_throttle()
+            raise
         
         text = getattr(response, "text", None)
         token_usage = response.usage_metadata.total_token_count
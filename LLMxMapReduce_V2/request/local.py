@@ -1,55 +1,153 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 import json
 
-from collections import defaultdict
+import gevent
+from gevent.event import AsyncResult
+from gevent.lock import Semaphore
 from json.decoder import JSONDecodeError
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_random_exponential,
-    before_sleep_log,
-    retry_if_exception_type
-)
 import logging
 logger = logging.getLogger(__name__)
 
 
+class _Batch:
+    def __init__(self, params):
+        self.params = params
+        self.instances = []
+        self.results = []
+        self.flushed = False
+
+
+class InferBatcher:
+    """
+    Coalesce the completions of concurrent greenlets into one /infer POST: the servers of V1
+    (URLs/*_url_m.py) generate every instance of a request in one batch. A batch is sent when it
+    reaches max_batch_size or max_wait seconds after its first instance, whichever comes first.
+    The server applies one set of params per request, so only calls with equal params share a batch.
+    """
+
+    def __init__(self, url, session, max_batch_size, max_wait):
+        self.url = url
+        self.session = session
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # params key: batch being filled, only touched between two gevent switches
+        self._pending = {}
+
+    def submit(self, messages, params):
+        key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(params)
+            gevent.spawn_later(self.max_wait, self._flush, key, batch)
+        result = AsyncResult()
+        batch.instances.append(messages)
+        batch.results.append(result)
+        if len(batch.instances) >= self.max_batch_size:
+            # the next caller starts a new batch even before this one is sent
+            del self._pending[key]
+            gevent.spawn(self._flush, key, batch)
+        return result.get()
+
+    def _flush(self, key, batch):
+        if batch.flushed:
+            return
+        batch.flushed = True
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        try:
+            answers = post_infer(self.session, self.url, batch.instances, batch.params)
+            if len(answers) != len(batch.instances):
+                raise HTTPError(
+                    f"{len(answers)} answers for a batch of {len(batch.instances)} instances"
+                )
+        except Exception as e:
+            # every caller is retried on its own by RequestWrapper, in a later batch
+            for result in batch.results:
+                result.set_exception(e)
+            return
+        logger.debug(f"Local batch of {len(batch.instances)} instances finished, url: {self.url}")
+        for result, answer in zip(batch.results, answers):
+            result.set(answer)
+
+
+def post_infer(session, url, instances, params):
+    result = None
+    try:
+        data = {"instances": instances, "params": params}
+        result = session.post(
+            url, json=data, headers={"Content-Type": "application/json"}
+        )
+        result.raise_for_status()
+        return json.loads(result.content)
+    except JSONDecodeError as e:
+        logger.error(
+            f"JSONDecodeError in LocalRequest.completion: {e}\nResult: {result.content}"
+        )
+        raise
+    except HTTPError as e:
+        logger.warning(
+            f"HTTPError in LocalRequest.completion: {e}\nResult: {result.content if result is not None else None}"
+        )
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected Error in LocalRequest.completion: {e}\n")
+        raise
+
+
 class LocalRequest:
-    def __init__(self, port):
+    """
+    Client of a self-hosted /infer server. Every LocalRequest of a port shares one pooled session and
+    one InferBatcher, so concurrent completions are sent together. Batching is set by
+    LOCAL_MAX_BATCH_SIZE (1 sends every completion alone) and LOCAL_MAX_WAIT_MS.
+    """
+
+    # retried by RequestWrapper, so every attempt goes through the rate limiter again
+    RETRY_EXCEPTIONS = (JSONDecodeError, HTTPError) # 如果不是这几个错就不retry了
+    MAX_ATTEMPTS = 30
+    DEFAULT_MAX_BATCH_SIZE = 32
+    DEFAULT_MAX_WAIT_MS = 10
+    DEFAULT_MAX_CONNECTIONS = 100
+    _batchers = {}
+    _batchers_lock = Semaphore(1)
+
+    def __init__(self, port, max_batch_size=None, max_wait_ms=None):
         self.url = f"http://localhost:{port}/infer"
         logger.warning(f"Token counter is not supported in LocalRequest, each request will be counted as 1 token")
+        if max_batch_size is None:
+            max_batch_size = int(os.environ.get("LOCAL_MAX_BATCH_SIZE", self.DEFAULT_MAX_BATCH_SIZE))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.environ.get("LOCAL_MAX_WAIT_MS", self.DEFAULT_MAX_WAIT_MS))
+        self.batcher = self._get_shared_batcher(self.url, max_batch_size, max_wait_ms / 1000)
+
+    @classmethod
+    def _get_shared_batcher(cls, url, max_batch_size, max_wait):
+        with cls._batchers_lock:
+            if url not in cls._batchers:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=cls.DEFAULT_MAX_CONNECTIONS,
+                )
+                session.mount("http://", adapter)
+                cls._batchers[url] = InferBatcher(url, session, max_batch_size, max_wait)
+                logger.info(
+                    f"Local inference batcher created: url={url}, max_batch_size={max_batch_size}, max_wait={max_wait}s"
+                )
+            return cls._batchers[url]
 
-    @retry(
-        wait=wait_random_exponential(multiplier=2, max=60),
-        stop=stop_after_attempt(30),
-        retry=retry_if_exception_type((JSONDecodeError, HTTPError)) # 如果不是这几个错就不retry了
-    )
     def completion(self, messages, **kwargs):
-        try:
-            config = self._format_config_params(kwargs)
-            data = {"instances": [messages], "params": config}
-            result = requests.post(
-                self.url, json=data, headers={"Content-Type": "application/json"}
-            )
-            result.raise_for_status()
-            answer = json.loads(result.content)[0]
-        except JSONDecodeError as e:
-            logger.error(
-                f"JSONDecodeError in LocalRequest.completion: {e}\nResult: {result.content}"
-            )
-            raise
-        except HTTPError as e:
-            logger.warning(f"HTTPError in LocalRequest.completion: {e}\nResult: {result.content}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected Error in LocalRequest.completion: {e}\n")
-            raise
+        config = self._format_config_params(kwargs)
+        if self.batcher.max_batch_size <= 1:
+            answer = post_infer(self.batcher.session, self.url, [messages], config)[0]
+        else:
+            answer = self.batcher.submit(messages, config)
         return answer, 1
 
     def _format_config_params(self, kwargs):
         config = {}
         for key, value in kwargs.items():
             config[key] = value
-        return config
\ No newline at end of file
+        return config
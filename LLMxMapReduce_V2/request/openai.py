@@ -1,17 +1,18 @@
 import os
+import importlib.util
+import httpx
+from gevent.lock import Semaphore
 from openai import OpenAI, InternalServerError, RateLimitError, APIError
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_random_exponential,
-    before_sleep_log,
-    retry_if_exception_type
-)
+from .rate_limiter import RateLimiter
 import logging
 logger = logging.getLogger(__name__)
 
 
 class OpenAIRequest:
+    # retried by RequestWrapper, so every attempt goes through the rate limiter again
+    RETRY_EXCEPTIONS = (RateLimitError, InternalServerError, APIError)
+    MAX_ATTEMPTS = 100
+
     def __init__(self, model):
         self.client = OpenAI(
             api_key=os.environ.get("OPENAI_API_KEY"),
@@ -42,11 +43,6 @@ class OpenAIRequest:
         logger.debug(f"Validated messages length: {total_length} chars")
         return valid_messages
 
-    @retry(
-        wait=wait_random_exponential(multiplier=2, max=60),
-        stop=stop_after_attempt(100),
-        retry=retry_if_exception_type((RateLimitError, InternalServerError, APIError))
-        )
     def completion(self, messages, **kwargs):
         try:
             messages = self._validate_messages_length(messages)
@@ -63,6 +59,7 @@ class OpenAIRequest:
 
         except RateLimitError as e:
             logger.warning(f"Rate limit exceeded in OpenAIRequest.completion: {e}")
+            RateLimiter.get(self.model).on_throttle()
             raise 
         except InternalServerError as e:
             logger.warning(f"Internal server error in OpenAIRequest.completion: {e}")
@@ -73,3 +70,45 @@ class OpenAIRequest:
             raise 
                 
         return answer, token_usage
+
+
+class OpenAIPooledRequest(OpenAIRequest):
+    """
+    OpenAIRequest whose instances all share one OpenAI client per (api key, base url), so every
+    completion in the process is multiplexed over a single keep-alive connection pool instead of
+    each RequestWrapper opening its own connections. HTTP/2 is used when `h2` is installed.
+    The pool size per host is read from OPENAI_MAX_CONNECTIONS.
+    """
+
+    DEFAULT_MAX_CONNECTIONS = 100
+    _clients = {}
+    _clients_lock = Semaphore(1)
+
+    def __init__(self, model):
+        self.client = self._get_shared_client(
+            os.environ.get("OPENAI_API_KEY"), os.environ.get("OPENAI_API_BASE")
+        )
+        self.model = model
+
+    @classmethod
+    def _get_shared_client(cls, api_key, base_url):
+        with cls._clients_lock:
+            if (api_key, base_url) not in cls._clients:
+                max_connections = int(
+                    os.environ.get("OPENAI_MAX_CONNECTIONS", cls.DEFAULT_MAX_CONNECTIONS)
+                )
+                http2 = importlib.util.find_spec("h2") is not None
+                http_client = httpx.Client(
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    ),
+                )
+                cls._clients[(api_key, base_url)] = OpenAI(
+                    api_key=api_key, base_url=base_url, http_client=http_client
+                )
+                logger.info(
+                    f"Shared OpenAI connection pool created: base_url={base_url}, max_connections={max_connections}, http2={http2}"
+                )
+            return cls._clients[(api_key, base_url)]
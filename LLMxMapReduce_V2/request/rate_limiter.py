@@ -0,0 +1,171 @@
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+import gevent
+from gevent.event import Event
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.refill_rate = self.capacity / 60  # per second
+        self.last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate
+        )
+        self.last_refill = now
+
+    def acquire(self, amount):
+        # a single request larger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            gevent.sleep((amount - self.tokens) / self.refill_rate)
+
+    def consume(self, amount):
+        # correct an estimate afterwards, may leave the bucket in debt
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Process-wide limiter of one model, shared by every RequestWrapper using that model.
+
+    Requests per minute and tokens per minute are enforced by token buckets, and the number of
+    requests in flight is adapted AIMD-style: halved when the provider answers 429, increased by
+    about one per window of successful calls, up to max_concurrency.
+    """
+
+    DECREASE_FACTOR = 0.5
+    DECREASE_COOLDOWN = 1.0  # seconds, 429s of the same burst only back off once
+    CHARS_PER_TOKEN = 4
+
+    _limiters = {}
+    _config = {}
+    _lock = Semaphore(1)
+
+    def __init__(self, model, rpm=None, tpm=None, max_concurrency=20, min_concurrency=1):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.throttle_count = 0
+        self._last_decrease = 0
+        self._waiters = deque()
+
+    @classmethod
+    def configure(cls, config):
+        """
+        config: {model name or "default": {"rpm": int, "tpm": int, "max_concurrency": int, "min_concurrency": int}}
+        The max_concurrency of "default" is overridden by the connection of RequestWrapper.
+        """
+        cls._config = config or {}
+
+    @classmethod
+    def get(cls, model, max_concurrency=20):
+        with cls._lock:
+            if model not in cls._limiters:
+                # the config of the model overrides the connection of its first wrapper, which
+                # overrides the default config
+                model_config = dict(cls._config.get("default", {}))
+                model_config["max_concurrency"] = max_concurrency
+                model_config.update(cls._config.get(model, {}))
+                cls._limiters[model] = cls(model, **model_config)
+                logger.info(f"Rate limiter of {model} created: {model_config}")
+            return cls._limiters[model]
+
+    @classmethod
+    def all_limiters(cls):
+        return list(cls._limiters.values())
+
+    @contextmanager
+    def limit(self, messages):
+        estimated_tokens = sum(len(m["content"]) for m in messages) // self.CHARS_PER_TOKEN
+        self._acquire_slot()
+        try:
+            if self.request_bucket is not None:
+                self.request_bucket.acquire(1)
+            if self.token_bucket is not None:
+                self.token_bucket.acquire(estimated_tokens)
+            yield
+            self.on_success()
+        finally:
+            self._release_slot()
+
+    def record_usage(self, messages, total_tokens):
+        if self.token_bucket is not None and total_tokens:
+            estimated_tokens = sum(len(m["content"]) for m in messages) // self.CHARS_PER_TOKEN
+            self.token_bucket.consume(total_tokens - estimated_tokens)
+
+    def on_success(self):
+        if self.concurrency < self.max_concurrency:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+            self._wake_waiters()
+
+    def on_throttle(self):
+        self.throttle_count += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.concurrency = max(
+            self.min_concurrency, self.concurrency * self.DECREASE_FACTOR
+        )
+        logger.warning(
+            f"Rate limited on {self.model}, concurrency reduced to {int(self.concurrency)}"
+        )
+
+    def _acquire_slot(self):
+        # greenlets are cooperative, nothing can interleave between the check and the increment
+        while self.in_flight >= int(self.concurrency):
+            waiter = Event()
+            self._waiters.append(waiter)
+            try:
+                waiter.wait()
+            except BaseException:
+                # a greenlet killed while waiting must not be woken in place of a live one,
+                # and passes its wake-up on if it already got one
+                if waiter.is_set():
+                    self._wake_waiters()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+        self.in_flight += 1
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        free_slots = int(self.concurrency) - self.in_flight
+        while free_slots > 0 and self._waiters:
+            self._waiters.popleft().set()
+            free_slots -= 1
+
+    def stats(self):
+        return {
+            "concurrency": int(self.concurrency),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "throttled": self.throttle_count,
+        }
@@ -1,36 +1,162 @@
+import json
 import logging
+from collections import defaultdict
+
+import gevent
+from gevent.lock import Semaphore
 from tabulate import tabulate
 
+from async_d.analyser.metrics import LatencyHistogram
+
 logger = logging.getLogger(__name__)
 
+UNLABELED = "unlabeled"
+
+
+def label_greenlet(greenlet, **labels):
+    """Attach usage labels (e.g. neuron, survey) to a greenlet, inherited by the greenlets it spawns."""
+    greenlet.usage_labels = {key: value for key, value in labels.items() if value}
+
+
+def current_usage_labels():
+    # walk up the spawn chain, the nearest label wins
+    labels = {}
+    greenlet = gevent.getcurrent()
+    while greenlet is not None:
+        for key, value in getattr(greenlet, "usage_labels", {}).items():
+            labels.setdefault(key, value)
+        spawning_greenlet = getattr(greenlet, "spawning_greenlet", None)
+        greenlet = spawning_greenlet() if spawning_greenlet is not None else None
+    return labels
+
+
+def parse_token_usage(token_usage):
+    """Normalize the token usage returned by the backends to (prompt, completion, total)."""
+    if token_usage is None:
+        return 0, 0, 0
+    if isinstance(token_usage, int):
+        return 0, 0, token_usage
+    prompt_tokens = getattr(token_usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(token_usage, "completion_tokens", 0) or 0
+    total_tokens = getattr(token_usage, "total_tokens", 0) or prompt_tokens + completion_tokens
+    return prompt_tokens, completion_tokens, total_tokens
+
+
+class UsageStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, prompt_tokens, completion_tokens, total_tokens, latency):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.total_tokens += total_tokens
+        self.latency.observe(latency)
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class UsageTracker:
+    """
+    Streaming aggregation of LLM calls per model, per neuron and per survey. Memory only grows
+    with the number of distinct labels, not with the number of calls.
+    """
+
+    def __init__(self):
+        self._lock = Semaphore(1)
+        self.total = UsageStats()
+        self.by_model = defaultdict(UsageStats)
+        self.by_neuron = defaultdict(UsageStats)
+        self.by_survey = defaultdict(UsageStats)
+
+    def record(self, model, token_usage, latency):
+        usage = parse_token_usage(token_usage)
+        labels = current_usage_labels()
+        with self._lock:
+            for stats in self._all_stats(model, labels):
+                stats.add(*usage, latency)
+
+    def record_error(self, model):
+        labels = current_usage_labels()
+        with self._lock:
+            for stats in self._all_stats(model, labels):
+                stats.errors += 1
+
+    def _all_stats(self, model, labels):
+        return [
+            self.total,
+            self.by_model[model],
+            self.by_neuron[labels.get("neuron", UNLABELED)],
+            self.by_survey[labels.get("survey", UNLABELED)],
+        ]
+
+    def survey_tokens(self, survey):
+        stats = self.by_survey.get(survey)
+        return stats.total_tokens if stats is not None else 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "total": self.total.to_dict(),
+                "model": {k: v.to_dict() for k, v in self.by_model.items()},
+                "neuron": {k: v.to_dict() for k, v in self.by_neuron.items()},
+                "survey": {k: v.to_dict() for k, v in self.by_survey.items()},
+            }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def report(self, group="model"):
+        stats_dict = {
+            "model": self.by_model,
+            "neuron": self.by_neuron,
+            "survey": self.by_survey,
+        }[group]
+        table = []
+        with self._lock:
+            for name, stats in sorted(stats_dict.items()):
+                table.append(
+                    [
+                        name,
+                        stats.calls,
+                        stats.errors,
+                        stats.prompt_tokens,
+                        stats.completion_tokens,
+                        stats.total_tokens,
+                        f"{stats.latency.sum / stats.latency.count:.2f}s" if stats.latency.count else "N/A",
+                        f"{stats.latency.quantile(0.95):.2f}s" if stats.latency.count else "N/A",
+                    ]
+                )
+        headers = [group.capitalize(), "Calls", "Errors", "Prompt", "Completion", "Total", "Avg Latency", "P95 Latency"]
+        return tabulate(table, headers, tablefmt="grid")
+
 
 def track_completion_calls(cls):
     original_completion = cls.completion
 
-    def _completion_counter():
-        cls._calls_count += 1
-        logger.info(f"Current total count of openai api calls: {cls._calls_count}")
-        return
-    
     def token_logger(self, *args, **kwargs):
         answer = original_completion(self, *args, **kwargs)
-        _completion_counter()
-        table_data = []
-        for count, token_usage in enumerate(cls._token_usage_history):
-            if token_usage is None:
-                token_usage_info = "missing"
-            else:
-                token_usage_info = (
-                    f"(completion_tokens={token_usage.completion_tokens}, "
-                    f"prompt_tokens={token_usage.prompt_tokens}, "
-                    f"total_tokens={token_usage.total_tokens})"
-                )
-            table_data.append([count+1, token_usage_info])
-        logger.info(tabulate(
-            table_data, 
-            headers=["Index", "Token Usage"], 
-            tablefmt="grid"
-        ))
+        total = cls._usage_tracker.total
+        logger.info(
+            f"Current total count of api calls: {total.calls}, "
+            f"(completion_tokens={total.completion_tokens}, "
+            f"prompt_tokens={total.prompt_tokens}, "
+            f"total_tokens={total.total_tokens})"
+        )
         return answer
 
     cls.completion = token_logger
@@ -1,8 +1,17 @@
+import time
 from typing import List, Dict
-from gevent.lock import Semaphore
 from .local import LocalRequest
-from .openai import OpenAIRequest
+from .openai import OpenAIRequest, OpenAIPooledRequest
 from .google import GoogleRequest
+from .cache import RequestCache
+from .rate_limiter import RateLimiter
+from .token_counter import UsageTracker
+from tenacity import (
+    Retrying,
+    stop_after_attempt,
+    wait_random_exponential,
+    retry_if_exception_type
+)
 
 import logging
 logger = logging.getLogger(__name__)
@@ -10,9 +19,8 @@ logger = logging.getLogger(__name__)
 
 
 class RequestWrapper:
-    _connection_semaphore = {}
-    _calls_count = 0 # 用来统计api的调用次数
-    _token_usage_history = [] # 用来统计每次调用时使用的token数
+    _usage_tracker = UsageTracker() # 按模型/neuron/survey 统计调用次数, token 数与延迟
+    _cache = None # 进程内共享的响应缓存, 通过 enable_cache 开启
 
     def __init__(self, model="gemini-2.0-flash-thinking-exp-1219", infer_type="OpenAI", connection=20, port=None, max_context_length=163840):
         if not model:
@@ -21,17 +29,22 @@ class RequestWrapper:
         
         self.request_pool = None
         self.model = model
-        self._connection_semaphore[model] = Semaphore(connection)
+        self.infer_type = infer_type
+        # shared by all wrappers of the same model, connection (of the first one) is the max concurrency
+        # unless rate_limit sets max_concurrency for this model
+        self.rate_limiter = RateLimiter.get(model, max_concurrency=connection)
 
         if infer_type == "OpenAI":
             self.request_pool = OpenAIRequest(model=model)
+        elif infer_type == "OpenAIPooled":
+            self.request_pool = OpenAIPooledRequest(model=model)
         elif infer_type == "Google":
             self.request_pool = GoogleRequest(model=model)  
         elif infer_type == "local":
             self.request_pool = LocalRequest(port=port)
         else:
             raise ValueError(
-                f"Invalid infer_type: {infer_type}, should be OpenAI or local"
+                f"Invalid infer_type: {infer_type}, should be OpenAI, OpenAIPooled, Google or local"
             )
 
     def completion(self, message, **kwargs):
@@ -49,20 +62,54 @@ class RequestWrapper:
                 raise ValueError(
                     "message should be a List[Dict['role':str, 'content':str]]"
                 )
-                
-        if self.model in self._connection_semaphore:
-            with self._connection_semaphore[self.model]:
-                logger.debug(f"Acquired semaphore for {self.model} (remain={self._connection_semaphore[self.model].counter})")
-                result, token_usage = self.request_pool.completion(message, **kwargs)
-        else:
-            result, token_usage = self.request_pool.completion(message, **kwargs)
-            
-        self._calls_count += 1
-        self._token_usage_history.append(token_usage)
-            
+
+        cache_key = None
+        if self._cache is not None:
+            cache_key = self._cache.make_key(self.model, self.infer_type, message, kwargs)
+            result = self._cache.get(cache_key)
+            if result is not None:
+                logger.debug(f"Cache hit for {self.model}")
+                return result
+
+        # retry here rather than in the request pool: every attempt takes a slot and tokens of the
+        # rate limiter again, and the slot is released during the backoff
+        for attempt in Retrying(
+            wait=wait_random_exponential(multiplier=2, max=60),
+            stop=stop_after_attempt(self.request_pool.MAX_ATTEMPTS),
+            retry=retry_if_exception_type(self.request_pool.RETRY_EXCEPTIONS),
+        ):
+            with attempt:
+                result = self._limited_completion(message, **kwargs)
+
         logger.debug(f"Requesting completion received")
         if not result:
             raise ValueError(
                 f"Requesting completion failed, return with empty result, message length: {len(str(message))}"
             )
+        if cache_key is not None:
+            self._cache.put(cache_key, result)
         return result
+
+    def _limited_completion(self, message, **kwargs):
+        with self.rate_limiter.limit(message):
+            logger.debug(f"Acquired rate limiter for {self.model} (in flight={self.rate_limiter.in_flight})")
+            start_time = time.time()
+            try:
+                result, token_usage = self.request_pool.completion(message, **kwargs)
+            except Exception:
+                self._usage_tracker.record_error(self.model)
+                raise
+        self.rate_limiter.record_usage(
+            message, getattr(token_usage, "total_tokens", token_usage)
+        )
+        self._usage_tracker.record(self.model, token_usage, time.time() - start_time)
+        return result
+
+    @classmethod
+    def enable_cache(cls, cache_dir, max_memory_entries=4096):
+        cls._cache = RequestCache(cache_dir, max_memory_entries=max_memory_entries)
+        return cls._cache
+
+    @classmethod
+    def usage_tracker(cls):
+        return cls._usage_tracker
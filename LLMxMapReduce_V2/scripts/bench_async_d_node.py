@@ -0,0 +1,175 @@
+"""
+Throughput benchmark of async_d Node against the former locked-generator Node: a Sequential pipeline
+of --nodes nodes with --workers workers each, pushing --items Document items compared by value over
+--sections sections, like the surveys flowing in the real pipeline, plus the same with a node
+unpacking batches (is_data_iterable).
+
+Usage: python scripts/bench_async_d_node.py --nodes 5 --workers 100 --items 100000
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import functools
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gevent
+from gevent import sleep, spawn
+from gevent.lock import Semaphore
+from async_d import Node, Sequential
+from async_d.exceptions import NodeProcessingError, NodeStop
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+
+class LockedNode(Node):
+    # the former implementation, workers take turns on one generator behind a lock, track the data
+    # in flight in a list, looked up and removed by value, and copy the @retry controller per call
+    def _error_decorator(self, func):
+        @retry(
+            stop=stop_after_attempt(5),
+            wait=wait_exponential_jitter(max=10),
+            retry=retry_if_exception_type(Exception),
+        )
+        @functools.wraps(func)
+        def input_wrapper(data):
+            if self.no_input:
+                result = func()
+            else:
+                result = func(data)
+            return result
+
+        @functools.wraps(func)
+        def error_wrapper(data):
+            try:
+                return input_wrapper(data)
+            except Exception as e:
+                error_stack = traceback.format_exc()
+                return NodeProcessingError((data), self.__name__, e, error_stack)
+
+        return error_wrapper
+
+    def _spawn_workers(self):
+        self.get_data_lock = Semaphore(1)
+        self.executing_data_queue = []
+        for i in range(self.worker_num):
+            task = spawn(self._func_wrapper, i)
+            self.tasks.append(task)
+
+        self.get_data_generator = self._get_data()
+        self.is_start = True
+        return self.tasks
+
+    def _func_wrapper(self, task_id):
+        while self.is_start:
+            data = None
+            try:
+                if not self.no_input:
+                    with self.get_data_lock:
+                        data = next(self.get_data_generator)
+                    if isinstance(data, NodeStop):
+                        raise NodeStop()
+                    self.executing_data_queue.append(data)
+                result = self._proc_data(data)
+                self._put_data(result)
+            except NodeStop:
+                break
+            finally:
+                if data in self.executing_data_queue:
+                    self.executing_data_queue.remove(data)
+            if task_id == 0 and self._is_upstream_end():
+                self.end()
+                break
+            sleep(0)
+        if all(task.ready() for task in self.tasks if task != gevent.getcurrent()):
+            self.is_start = False
+
+    def _get_data(self):
+        while self.is_start:
+            data = self.src_queue.get()
+            yield from self._get_one_data(data)
+        yield NodeStop()
+
+
+class Document:
+    # compared section by section in python, every by-value lookup among the in-flight data costs
+    def __init__(self, doc_id, sections):
+        self.doc_id = doc_id
+        self.sections = sections
+
+    def __eq__(self, other):
+        if not isinstance(other, Document):
+            return NotImplemented
+        for section, other_section in zip(self.sections, other.sections):
+            if section != other_section:
+                return False
+        return self.doc_id == other.doc_id
+
+
+def make_identity(latency):
+    def identity(data):
+        # wait like a node calling an LLM, so the workers of the node hold data in flight
+        gevent.sleep(latency)
+        return data
+
+    return identity
+
+
+def run(node_class, node_num, worker_num, item_num, section_num, latency, batch_size=None):
+    done = gevent.event.Event()
+    received = [0]
+
+    def sink(data):
+        received[0] += 1
+        if received[0] == item_num:
+            done.set()
+
+    identity = make_identity(latency)
+    nodes = []
+    if batch_size:
+        nodes.append(node_class(identity, worker_num=worker_num, queue_size=worker_num, is_data_iterable=True))
+    while len(nodes) < node_num - 1:
+        nodes.append(node_class(identity, worker_num=worker_num, queue_size=worker_num))
+    nodes.append(node_class(sink, worker_num=worker_num, queue_size=worker_num, no_output=True))
+    for i, node in enumerate(nodes):
+        node.set_name(f"node_{i}")
+    pipeline = Sequential(nodes)
+    pipeline.start()
+
+    sections = [f"section {i} " + "x" * 64 for i in range(section_num)]
+    start = time.perf_counter()
+    if batch_size:
+        for i in range(0, item_num, batch_size):
+            pipeline.put([Document(j, sections) for j in range(i, min(i + batch_size, item_num))])
+    else:
+        for i in range(item_num):
+            pipeline.put(Document(i, sections))
+    done.wait()
+    elapsed = time.perf_counter() - start
+    for node in nodes:
+        gevent.killall(node.tasks)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=100)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--sections", type=int, default=20, help="sections compared by Document.__eq__")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds each node holds an item")
+    parser.add_argument("--batch_size", type=int, default=100, help="items per batch of the unpacking run")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{args.nodes} nodes x {args.workers} workers, {args.items} items")
+    print(f"{'run':>10} {'locked (s)':>12} {'current (s)':>12} {'speedup':>9}")
+    for name, batch_size in (("plain", None), ("unpacking", args.batch_size)):
+        locked = run(LockedNode, args.nodes, args.workers, args.items, args.sections, args.latency, batch_size)
+        current = run(Node, args.nodes, args.workers, args.items, args.sections, args.latency, batch_size)
+        print(f"{name:>10} {locked:>12.2f} {current:>12.2f} {locked / current:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of MultiKeyDict against the former linear scan, on the access pattern of a survey:
+build the digests, look up every cited bibkey, check membership, list the keys and delete.
+
+Usage: python scripts/bench_multi_key_dict.py --papers 500 1000 2000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.data_structure.multi_key_dict import MultiKeyDict
+
+
+class LinearMultiKeyDict:
+    # the former implementation, every lookup scans all key groups
+    def __init__(self):
+        self._data = {}
+
+    def __setitem__(self, keys, value):
+        self._data[frozenset(keys)] = value
+
+    def get(self, key):
+        for keys, digest in self._data.items():
+            if key in keys:
+                return digest
+        return None
+
+    def keys(self):
+        return {key for keys in self._data.keys() for key in keys}
+
+    def __contains__(self, key):
+        return any(key in keys for keys in self._data.keys())
+
+    def __delitem__(self, key):
+        for keys in list(self._data.keys()):
+            if key in keys:
+                del self._data[keys]
+                break
+
+
+def make_groups(paper_num, group_size):
+    bibkeys = [f"paper{i}" for i in range(paper_num)]
+    random.shuffle(bibkeys)
+    return [bibkeys[i : i + group_size] for i in range(0, paper_num, group_size)]
+
+
+def run(dict_class, groups, lookups, keys_calls):
+    timings = {}
+    start = time.perf_counter()
+    digests = dict_class()
+    for group in groups:
+        digests[set(group)] = group
+    timings["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for bibkey in lookups:
+        digests.get(bibkey)
+    timings["get"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for bibkey in lookups:
+        bibkey in digests
+    timings["contains"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(keys_calls):
+        digests.keys()
+    timings["keys"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for group in groups:
+        del digests[group[0]]
+    timings["delete"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--group_size", type=int, default=2, help="bibkeys per digest")
+    parser.add_argument("--lookups", type=int, default=20000, help="cited bibkey lookups")
+    parser.add_argument("--keys_calls", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(0)
+
+    print(f"{'papers':>7} {'op':>9} {'linear (s)':>12} {'indexed (s)':>12} {'speedup':>9}")
+    for paper_num in args.papers:
+        groups = make_groups(paper_num, args.group_size)
+        lookups = [random.choice(random.choice(groups)) for _ in range(args.lookups)]
+        linear = run(LinearMultiKeyDict, groups, lookups, args.keys_calls)
+        indexed = run(MultiKeyDict, groups, lookups, args.keys_calls)
+        for op in linear:
+            speedup = linear[op] / indexed[op] if indexed[op] else float("inf")
+            print(f"{paper_num:>7} {op:>9} {linear[op]:>12.4f} {indexed[op]:>12.4f} {speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
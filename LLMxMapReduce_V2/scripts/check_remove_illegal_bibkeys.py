@@ -0,0 +1,193 @@
+"""
+Regression check of remove_illegal_bibkeys against the former implementation, on generated sections
+mixing legal, misspelled and unknown bibkeys, quoted and unquoted references, empty brackets and formulas.
+
+The former implementation rebuilt the brackets it removed an illegal bibkey from through a set, so only
+the order of the bibkeys inside brackets may differ. Its two known bugs are kept out of the inputs:
+fewer than ten formulas per section, and misspelled bibkeys are never a substring of another bibkey.
+
+Usage: python scripts/check_remove_illegal_bibkeys.py --cases 3000
+"""
+import os
+import re
+import sys
+import random
+import logging
+import argparse
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.exceptions import BibkeyNotFoundError
+from src.utils.process_str import remove_illegal_bibkeys, str2list, list2str
+
+
+def legacy_process_bibkeys(raw_content):
+    raw_content = re.sub(r'\[\s*\]', '', raw_content)
+    references_reg = re.compile(r"(\[.*?\])", re.DOTALL)
+    bibkeys = references_reg.findall(raw_content)
+    bibkeys = set([bibkey for bibkey in bibkeys])
+    for bibkey in bibkeys:
+        new_bibkey = list2str(str2list(bibkey))
+        if new_bibkey != bibkey:
+            raw_content = raw_content.replace(bibkey, new_bibkey)
+    return raw_content
+
+
+def legacy_remove_illegal_bibkeys(content, legal_bibkeys, raise_error=False):
+    # the former implementation, one str.replace over the whole content per formula and per bibkey
+    def get_rest_bibkeys(content, references_reg):
+        current_bibkeys = set()
+        for match in references_reg.finditer(content):
+            bibkey_str = match.group(1)
+            bibkey_list = str2list(bibkey_str)
+            for bibkey in bibkey_list:
+                current_bibkeys.add(bibkey.strip())
+
+        rest_bibkeys = current_bibkeys - set(legal_bibkeys)
+        return rest_bibkeys
+
+    math_placeholders = {}
+    math_count = 0
+
+    block_math_pattern = r'\$\$[^\$]+\$\$'
+    for match in re.finditer(block_math_pattern, content):
+        placeholder = f'MATH_PLACEHOLDER_{math_count}'
+        math_placeholders[placeholder] = match.group(0)
+        content = content.replace(match.group(0), placeholder)
+        math_count += 1
+
+    inline_math_pattern = r'\$[^\$]+\$'
+    for match in re.finditer(inline_math_pattern, content):
+        placeholder = f'MATH_PLACEHOLDER_{math_count}'
+        math_placeholders[placeholder] = match.group(0)
+        content = content.replace(match.group(0), placeholder)
+        math_count += 1
+
+    references_reg = re.compile(r"(\[.*?\])", re.DOTALL)
+    content = references_reg.sub(lambda m: m.group(0).replace("-", "_").replace("'", "'").replace("'", "'"), content)
+
+    rest_bibkeys = get_rest_bibkeys(content, references_reg)
+
+    for rest_bibkey in list(rest_bibkeys):
+        for legal_bibkey in legal_bibkeys:
+            if SequenceMatcher(None, rest_bibkey, legal_bibkey).ratio() > 0.8:
+                content = content.replace(rest_bibkey, legal_bibkey)
+                rest_bibkeys.remove(rest_bibkey)
+                break
+
+    if rest_bibkeys and raise_error:
+        raise BibkeyNotFoundError(bibkeys=rest_bibkeys, content=content, legal_bibkeys=legal_bibkeys)
+    elif rest_bibkeys:
+        ref_lists = references_reg.findall(content)
+        if ref_lists:
+            for ref_str in set(ref_lists):
+                ref_result = str2list(ref_str)
+                for ref in ref_result[:]:
+                    if ref in rest_bibkeys:
+                        ref_result.remove(ref)
+                ref_result = list(set(ref_result))
+                content = content.replace(ref_str, list2str(ref_result))
+
+    content = legacy_process_bibkeys(content)
+
+    for placeholder, math_content in math_placeholders.items():
+        content = content.replace(placeholder, math_content)
+
+    return content
+
+
+WORDS = "the model uses attention and retrieval for language tasks with large data".split()
+AUTHORS = ["smith", "doe", "lee", "wang", "zhang", "li", "brown"]
+
+
+def make_bibkey():
+    return (
+        random.choice(AUTHORS)
+        + str(random.randint(2015, 2024))
+        + random.choice("abcd")
+        + random.choice(["_llm", "-srv"])
+    )
+
+
+def misspell(bibkey):
+    middle = len(bibkey) // 2
+    return bibkey[:middle] + "q" + bibkey[middle + 1 :]
+
+
+def make_case():
+    legal_bibkeys = list({make_bibkey().replace("-", "_") for _ in range(random.randint(1, 60))})
+    parts = []
+    math_count = 0
+    for _ in range(random.randint(3, 40)):
+        r = random.random()
+        if r < 0.6:
+            parts.append(" ".join(random.choices(WORDS, k=random.randint(1, 12))))
+        elif r < 0.85:
+            bibkeys = []
+            for _ in range(random.randint(1, 4)):
+                if random.random() < 0.7:
+                    bibkeys.append(random.choice(legal_bibkeys))
+                elif random.random() < 0.5:
+                    bibkeys.append(misspell(random.choice(legal_bibkeys)))
+                else:
+                    bibkeys.append(make_bibkey())
+            quote = random.choice(["{}", "'{}'", '"{}"'])
+            reference = "[" + ", ".join(quote.format(bibkey) for bibkey in bibkeys) + "]"
+            parts.append(reference + random.choice(["", "."]))
+        elif r < 0.95 and math_count < 9:
+            math_count += 1
+            formula = random.choice(["$x_{}$", "$$\\sum_{} a$$", "$[a, b]_{}$"])
+            parts.append(formula.format(random.randint(0, 3)))
+        else:
+            parts.append(random.choice(["[]", "[ ]", "\n\n## Section\n", "[ , ]"]))
+    return " ".join(parts), legal_bibkeys
+
+
+def normalize_reference_order(content):
+    return re.sub(
+        r"\[[^\]]*\]",
+        lambda match: "[" + ", ".join(sorted(match.group(0)[1:-1].split(", "))) + "]",
+        content,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    logging.disable(logging.WARNING)
+
+    identical = reordered = 0
+    for _ in range(args.cases):
+        content, legal_bibkeys = make_case()
+        expected = legacy_remove_illegal_bibkeys(content, legal_bibkeys)
+        result = remove_illegal_bibkeys(content, legal_bibkeys, raise_warning=False)
+        if result == expected:
+            identical += 1
+        elif normalize_reference_order(result) == normalize_reference_order(expected):
+            reordered += 1
+        else:
+            print(f"Mismatch\ncontent: {content}\nlegal bibkeys: {legal_bibkeys}")
+            print(f"former: {expected}\ncurrent: {result}")
+            sys.exit(1)
+
+        legacy_raised = current_raised = False
+        try:
+            legacy_remove_illegal_bibkeys(content, legal_bibkeys, raise_error=True)
+        except BibkeyNotFoundError:
+            legacy_raised = True
+        try:
+            remove_illegal_bibkeys(content, legal_bibkeys, raise_error=True, raise_warning=False)
+        except BibkeyNotFoundError:
+            current_raised = True
+        if legacy_raised != current_raised:
+            print(f"BibkeyNotFoundError mismatch\ncontent: {content}\nlegal bibkeys: {legal_bibkeys}")
+            sys.exit(1)
+
+    print(f"{args.cases} cases: {identical} identical, {reordered} identical up to the order inside brackets")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import os
 import re
-import asyncio
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Literal
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import logging
 from tenacity import retry, stop_after_attempt, before_log, retry_if_exception_type
@@ -15,7 +15,10 @@ from prompts import (
     QUERY_EXPAND_PROMPT_WITHOUT_ABSTRACT,
     LLM_CHECK_PROMPT,
     SNIPPET_FILTER_PROMPT,
+    SNIPPET_FILTER_BATCH_PROMPT,
 )
+from src.utils.search_cache import SearchCache
+from src.utils.bm25 import bm25_prefilter, log_prefilter_recall
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +53,17 @@ class LLM_search:
         Date format should be 'dd/mm/yyyy', e.g., '01/01/2023'.
 
     max_workers : int, optional, default=10
-        Maximum number of concurrent workers for processing search results.
+        Maximum number of concurrent workers for web searches and for processing search results.
+
+    search_cache : SearchCache, optional, default=None
+        Persistent cache of search results, queries searched within its TTL are not sent again.
+
+    snippet_batch_size : int, optional, default=10
+        Number of snippets scored by one LLM request, 1 scores every snippet with its own request.
+
+    prefilter_top_k : int, optional, default=None
+        Rank the snippets locally with BM25 against the topic and only score the top k with the LLM.
+        None scores every snippet.
     """
 
     def __init__(
@@ -61,6 +74,9 @@ class LLM_search:
         each_query_result: int = 10,
         filter_date: Optional[str] = None,
         max_workers: int = 10,
+        search_cache: Optional[SearchCache] = None,
+        snippet_batch_size: int = 10,
+        prefilter_top_k: Optional[int] = None,
     ):
 
         self.model = model
@@ -68,8 +84,17 @@ class LLM_search:
         self.each_query_result = each_query_result
         self.filter_date = filter_date
         self.max_workers = max_workers
+        self.search_cache = search_cache
+        self.snippet_batch_size = max(1, snippet_batch_size)
+        self.prefilter_top_k = prefilter_top_k
         self.request_pool = RequestWrapper(model=model, infer_type=infer_type)
 
+        # one pooled session shared by the concurrent searches
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
         self.bing_subscription_key = os.getenv('BING_SEARCH_V7_SUBSCRIPTION_KEY')
         self.bing_endpoint = os.getenv('BING_SEARCH_V7_ENDPOINT', "https://api.bing.microsoft.com/v7.0/search")
         self.serpapi_key = os.getenv("SERP_API_KEY")
@@ -174,13 +199,29 @@ class LLM_search:
     ):
         # return self._searxng_web_search(query)
         if self.use_searxng == "true":
-            return self._searxng_web_search(query)
+            backend, search_func = "searxng", self._searxng_web_search
         elif self.bing_subscription_key is not None:
-            return self._bing_web_search(query)
+            backend, search_func = "bing", self._bing_web_search
         elif self.serpapi_key is not None:
-            return self._serpapi_web_search(query)
+            backend, search_func = f"serpapi_{self.engine}", self._serpapi_web_search
         else:
             raise ValueError("No valid search engine key provided, please check your environment variables, SERPAPI_KEY or BING_SEARCH_V7_SUBSCRIPTION_KEY.")
+
+        if self.search_cache is None:
+            return search_func(query)
+
+        cache_key = self.search_cache.make_key(
+            backend, query, {"count": self.each_query_result, "filter_date": self.filter_date}
+        )
+        web_snippets = self.search_cache.get(cache_key)
+        if web_snippets is not None:
+            logger.info(f"Search cache hit for query: {query}")
+            return web_snippets
+        web_snippets = search_func(query)
+        # "No results" messages are not cached, the query may be retried later
+        if isinstance(web_snippets, dict):
+            self.search_cache.put(cache_key, query, web_snippets)
+        return web_snippets
             
  
     def _searxng_web_search(self, query: str):
@@ -190,7 +231,7 @@ class LLM_search:
             'format': 'json'
         }
         try:
-            response = requests.get("http://174.1.21.1:8082/search", params=params)
+            response = self.session.get("http://174.1.21.1:8082/search", params=params)
             response.raise_for_status()
             results = response.json()
             
@@ -222,7 +263,7 @@ class LLM_search:
         }
 
         try:
-            response = requests.get(self.bing_endpoint, headers=headers, params=params)
+            response = self.session.get(self.bing_endpoint, headers=headers, params=params)
             response.raise_for_status()
             if response.status_code == 200:
                 results = response.json()
@@ -300,7 +341,7 @@ class LLM_search:
             if self.filter_date is not None:
                 params["filters"] = f"cdr:1,cd_min:{self.filter_date}"
 
-        response = requests.get("https://serpapi.com/search.json", params=params)
+        response = self.session.get("https://serpapi.com/search.json", params=params)
 
         if response.status_code == 200:
             results = response.json()
@@ -379,6 +420,52 @@ class LLM_search:
             logger.error(f"Error calculating similarity score: {e}")
             return 0.0
 
+    def batch_snippet_filter(self, topic, snippets):
+        """Calculate similarity scores between topic and several snippets with one request
+
+        Snippets whose score is missing or invalid in the response are scored again one by one
+        with snippet_filter.
+
+        Args:
+            topic: The search topic
+            snippets: List of text snippets to compare against
+
+        Returns:
+            list: Similarity score between 0 and 100 of each snippet, in order
+        """
+        if len(snippets) == 1:
+            return [self.snippet_filter(topic, snippets[0])]
+
+        prompt = SNIPPET_FILTER_BATCH_PROMPT.format(
+            topic=topic,
+            count=len(snippets),
+            snippets="\n\n".join(
+                f"[{i + 1}] {snippet}" for i, snippet in enumerate(snippets)
+            ),
+        )
+        scores = {}
+        try:
+            res = self.request_pool.completion(prompt)
+            matches = re.findall(
+                r"<SCORE\s+id\s*=\s*[\"']?\[?(\d+)\]?[\"']?\s*>\s*(\d+(?:\.\d+)?)\s*</SCORE>",
+                res,
+            )
+            for index, score in matches:
+                index, score = int(index) - 1, float(score)
+                if 0 <= index < len(snippets) and 0 <= score <= 100:
+                    scores[index] = score
+        except Exception as e:
+            logger.error(f"Error calculating batch similarity scores: {e}")
+
+        missing = [i for i in range(len(snippets)) if i not in scores]
+        if missing:
+            logger.warning(
+                f"{len(missing)}/{len(snippets)} snippet scores missing in batch response, scoring them one by one"
+            )
+            for i in missing:
+                scores[i] = self.snippet_filter(topic, snippets[i])
+        return [scores[i] for i in range(len(snippets))]
+
     def batch_web_search(self, queries: list, topic: str, top_n: int = 20) -> list:
         """
         Perform batch web search for multiple queries and return filtered results by relevance.
@@ -394,33 +481,37 @@ class LLM_search:
         logger.info("Start to retrieve:")
         snippet_by_url = {}
 
-        # Process each query
-        for query in queries:
-            if not query:
-                logger.info("Skipping empty query")
-                continue
-
+        def search(query):
             logger.info(f"==================\nThe query to be searched: {query}")
-
             try:
                 web_snippets = self.web_search(query=query)
                 if isinstance(web_snippets, str):
                     logger.info(web_snippets)
-                    continue
+                    return {}
+                return web_snippets
             except Exception as e:
                 logger.error(f"Error occurred while searching for query '{query}': {e}")
-                continue
+                return {}
 
-            # Process search results
+        queries = [query for query in queries if query]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # map keeps the query order, so the first query still wins a duplicated URL
+            all_web_snippets = list(executor.map(search, queries))
+
+        # Process search results
+        for web_snippets in all_web_snippets:
             for info in web_snippets.values():
                 url = info.get("url")
                 if not url or url in snippet_by_url:
                     continue
                 snippet_by_url[url] = {
+                    "title": info.get("title", ""),
                     "date": info.get("date"),
                     "snippet": info.get("snippet"),
                 }
 
+        if self.search_cache is not None:
+            logger.info(f"Search cache stats: {self.search_cache.stats()}")
         if not snippet_by_url:
             logger.warning("No URLs were retrieved for the provided queries.")
             return []
@@ -429,63 +520,50 @@ class LLM_search:
             f"Retrieved {len(snippet_by_url)} unique URLs, calculating similarities..."
         )
 
-        # Create event loop
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        async def process_similarities():
-            queue = asyncio.Queue()
-
-            total_url = len(snippet_by_url)
-            # Producer: Add tasks to queue
-            for url, info in snippet_by_url.items():
-                if info["snippet"]:
-                    await queue.put((url, info["snippet"]))
-
-            async def consumer():
-                scored_urls = []
-                try:
-                    while True:
-                        try:
-                            url, snippet = queue.get_nowait()
-                            try:
-                                if snippet:
-                                    score = self.snippet_filter(topic, snippet)
-                                    scored_urls.append((score, url))
-                                    logger.info(
-                                        f"Snippet similarity Score: {score}, rest {queue.qsize()}/{total_url}, Processed URL: {url}, "
-                                    )
-                            finally:
-                                queue.task_done()
-                        except asyncio.QueueEmpty:
-                            break
-                except Exception as e:
-                    logger.error(f"Error in consumer: {e}, {traceback.format_exc()}")
-                return scored_urls
-
-            # Start fixed number of consumer tasks
-            consumers = [
-                asyncio.create_task(consumer()) for _ in range(self.max_workers)
-            ]
-
-            await queue.join()
-
-            # Collect all results
-            results = await asyncio.gather(*consumers)
-            all_scored_urls = []
-            for result in results:
-                all_scored_urls.extend(result)
-            return all_scored_urls
+        items = [(url, info["snippet"]) for url, info in snippet_by_url.items() if info["snippet"]]
+        bm25_ranks = None
+        if self.prefilter_top_k and len(items) > self.prefilter_top_k:
+            kept = bm25_prefilter(
+                topic,
+                [f"{snippet_by_url[url]['title']} {snippet}" for url, snippet in items],
+                self.prefilter_top_k,
+            )
+            bm25_ranks = {items[index][0]: rank for index, rank, _ in kept}
+            items = [items[index] for index, _, _ in kept]
+
+        total_url = len(items)
+        processed_count = 0
+        batches = [
+            items[i : i + self.snippet_batch_size]
+            for i in range(0, len(items), self.snippet_batch_size)
+        ]
+
+        def score(batch):
+            nonlocal processed_count
+            scores = self.batch_snippet_filter(topic, [snippet for _, snippet in batch])
+            processed_count += len(batch)
+            for (url, _), score in zip(batch, scores):
+                logger.info(
+                    f"Snippet similarity Score: {score}, processed {processed_count}/{total_url}, Processed URL: {url}, "
+                )
+            return [(score, url) for (url, _), score in zip(batch, scores)]
 
-        # Execute async processing
-        scored_urls = loop.run_until_complete(process_similarities())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            scored_urls = [
+                scored_url
+                for scored_batch in executor.map(score, batches)
+                for scored_url in scored_batch
+            ]
 
         # Sort by score and get top N results
         scored_urls.sort(reverse=True, key=lambda x: x[0])
         filtered_urls = [url for _, url in scored_urls[:top_n]]
+        if bm25_ranks is not None:
+            log_prefilter_recall(
+                "Snippet scoring",
+                [bm25_ranks[url] for url in filtered_urls],
+                self.prefilter_top_k,
+            )
 
         logger.info(f"Returning top {len(filtered_urls)} most relevant URLs.")
         return filtered_urls
@@ -5,7 +5,7 @@ def parse_args():
         description="Run the EntirePipeline with specified input, output, and prompt files.")
     
     # Input/output configuration
-    parser.add_argument("--topic", type=str, required=True,
+    parser.add_argument("--topic", type=str, required=False,
         help="Research topic for automatic content retrieval (type: str, alternative to --input_file)")
     parser.add_argument("--description", type=str, required=False, default=None,
         help="Detailed description of research topic used for query generation (type: str, default: None)")
@@ -17,6 +17,50 @@ def parse_args():
         help="Path to save processed output results")
     parser.add_argument("--config_file", type=str, default='config/model_config.json', 
         help="Path to model configuration JSON file (default: config/model_config.json)")
+    parser.add_argument("--snippet_prefilter_top_k", type=int, default=None,
+        help="Number of search snippets kept by a local BM25 ranking against the topic before LLM scoring\n"
+             "(type: int, default: None, every snippet is scored by the LLM)")
+    parser.add_argument("--page_prefilter_top_k", type=int, default=None,
+        help="Number of crawled pages kept by a local BM25 ranking against the topic before LLM filtering and scoring\n"
+             "(type: int, default: None, every page is processed by the LLM)")
+    parser.add_argument("--dedup_threshold", type=float, default=0.8,
+        help="Estimated Jaccard similarity above which crawled pages are near-duplicates, only the best copy is processed\n"
+             "(type: float, default: 0.8, 0 keeps every page)")
+    parser.add_argument("--crawl_store_dir", type=str, default=None,
+        help="Directory of the crawled page store (type: str, default: None):\n"
+             "- None/unspecified: Every URL is crawled again\n"
+             "- Path: Crawled markdown is kept there by normalized URL, pages fetched within a week are reused\n"
+             "  and older ones are revalidated with their ETag/Last-Modified before crawling again")
+    parser.add_argument("--search_cache_dir", type=str, default=None,
+        help="Directory of the web search result cache (type: str, default: None):\n"
+             "- None/unspecified: Every query is sent to the search engine\n"
+             "- Path: Results are kept there for a day and reused when the same query is searched again")
+    parser.add_argument("--cache_dir", type=str, default=None,
+        help="Directory of the LLM response cache (type: str, default: None):\n"
+             "- None/unspecified: Cache disabled, every prompt is sent to the model\n"
+             "- Path: Responses are persisted there and replayed when an identical prompt is sent again,\n"
+             "  e.g. when re-running a survey after a crash or a config tweak")
+    parser.add_argument("--checkpoint_dir", type=str, default=None,
+        help="Directory to checkpoint each survey after every hidden pipeline stage (type: str, default: None):\n"
+             "- None/unspecified: No checkpoint is written\n"
+             "- Path: The latest survey state (digests, skeleton, block cycle count) is saved there")
+    parser.add_argument("--resume", action="store_true",
+        help="Flag to resume from --checkpoint_dir:\n"
+             "- When present: Checkpointed surveys are re-injected right after their last completed stage,\n"
+             "  and are skipped when loading the input file\n"
+             "- When omitted: All surveys start from the beginning (default)")
+    parser.add_argument("--usage_file", type=str, default=None,
+        help="Path to dump the LLM usage statistics as JSON (type: str, default: None):\n"
+             "- None/unspecified: <output_file without extension>_usage.json\n"
+             "- Path: Calls, prompt/completion tokens and latency histograms per model, neuron and survey")
+    parser.add_argument("--metrics_port", type=int, default=None,
+        help="Port of the Prometheus metrics endpoint (type: int, default: None):\n"
+             "- None/unspecified: No endpoint is served\n"
+             "- Port: Queue depth, executing count, throughput and latency quantiles of every node,\n"
+             "  and latency/error counts of every model are served on http://<host>:<port>/metrics")
+    parser.add_argument("--metrics_textfile", type=str, default=None,
+        help="Path of a Prometheus textfile (*.prom) rewritten with the same metrics every report interval,\n"
+             "for the node_exporter textfile collector (type: str, default: None)")
 
     # Pipeline processing parameters
     parser.add_argument("--data_num", type=int, default=None, 
@@ -27,6 +71,12 @@ def parse_args():
              "Affects memory usage and processing time linearly")
     parser.add_argument("--parallel_num", type=int, default=1, 
         help="Number of parallel processing workers (default: 1)")
+    parser.add_argument("--exit_on_finish", action="store_true",
+        help="Exit once every loaded or resumed survey is saved or failed, instead of waiting for more input\n"
+             "(set by src/shard_pipeline.py for its workers)")
+    parser.add_argument("--idle_timeout", type=float, default=600,
+        help="With --exit_on_finish, fail once no node holds data for this many seconds while surveys are\n"
+             "still pending, e.g. dropped by a failed stage (type: float, default: 600)")
 
     # Content processing modes
     parser.add_argument("--digest_group_mode", type=str, choices=["random", "llm"], default="llm", 
@@ -5,12 +5,17 @@ import time
 import os
 import re
 import sys
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from crawl4ai import AsyncWebCrawler, CacheMode, CrawlerRunConfig
 sys.path.append("survey_writer")
 # Direct import from request.wrapper using exact path
 from request import RequestWrapper
 from typing import List
 from prompts import PAGE_REFINE_PROMPT, SIMILARITY_PROMPT
+from src.utils.crawl_store import CrawlStore, normalize_url
+from src.utils.bm25 import bm25_prefilter, log_prefilter_recall
+from src.utils.near_duplicate import NearDuplicateIndex
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,16 +32,38 @@ class AsyncCrawler:
     DEFAULT_SIMILARITY_THRESHOLD = 80
     DEFAULT_MIN_LENGTH = 350
     DEFAULT_MAX_LENGTH = 20000
+    DEFAULT_DEDUP_THRESHOLD = 0.8
+    # a later copy of an already forwarded page is only processed too when it is this much longer
+    DUPLICATE_LENGTH_GAIN = 1.1
 
-    def __init__(self, model="gemini-2.0-flash-thinking-exp-1219", infer_type="OpenAI"):
+    def __init__(
+        self,
+        model="gemini-2.0-flash-thinking-exp-1219",
+        infer_type="OpenAI",
+        crawl_store: CrawlStore = None,
+        prefilter_top_k: int = None,
+        dedup_threshold: float = DEFAULT_DEDUP_THRESHOLD,
+    ):
         """
         Initialize the AsyncCrawler.
 
         Args:
             model (str): Model identifier for text processing
             infer_type (str): Inference type, e.g., "OpenAI"
+            crawl_store (CrawlStore, optional): Store of crawled pages, fresh pages are not crawled again
+            prefilter_top_k (int, optional): Once every page is crawled, rank them locally with BM25 against
+                the topic and only filter and score the top k with the LLM. None processes every page
+            dedup_threshold (float, optional): Estimated Jaccard similarity above which two pages are near-duplicates,
+                only the best copy is kept. None keeps every page
         """
         self.request_pool = RequestWrapper(model=model, infer_type=infer_type)
+        self.crawl_store = crawl_store
+        self.prefilter_top_k = prefilter_top_k
+        self.dedup_threshold = dedup_threshold
+        self._crawler = None
+        # completion is synchronous, it runs in this bounded pool so the event loop keeps
+        # MAX_CONCURRENT_PROCESSES requests in flight for each of the filter and similarity stages
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_PROCESSES * 2)
 
     async def run(
         self,
@@ -47,11 +74,17 @@ class AsyncCrawler:
     ):
         """
         Asynchronously crawls a list of URLs, processes the crawled data, and saves the results.
-        The process is split into four stages:
-        1. URL crawling
+        Each page streams through the first three stages as soon as it is ready, connected by
+        bounded queues:
+        1. URL crawling, near-duplicates of an already crawled page are dropped
         2. Content filtering and title generation
         3. Similarity scoring
-        4. Result processing and saving
+        4. Result processing and saving, once every page is scored
+
+        Scored pages are appended to `<crawl_output_file_path>.partial` as they finish, the
+        final top_n selection is written to crawl_output_file_path at the end. A run on the same
+        crawl_output_file_path after an interruption resumes from the partial file: its pages are
+        kept and their URLs are not crawled again.
 
         Args:
             topic (str): The topic or theme associated with the URLs
@@ -60,29 +93,38 @@ class AsyncCrawler:
             top_n (int, optional): Maximum number of top results to save. Defaults to 80
         """
         process_start_time = time.time()
-        stage_time = process_start_time
-        logger.info(f"Starting crawling process for {len(url_list)} URLs")
-
-        # Stage 1: Concurrent URL crawling
-        results = await self._crawl_urls(topic, url_list)
-        logger.info(
-            f"Stage 1 - Crawling completed in {time.time() - stage_time:.2f} seconds, with {len(results)} results"
-        )
-        stage_time = time.time()
-
-        # Stage 2: Concurrent content filtering and title generation
-        results = await self._process_filter_and_titles(results)
+        unique_urls = {}
+        for url in url_list:
+            unique_urls.setdefault(normalize_url(url), url)
+        partial_file_path = crawl_output_file_path + ".partial"
+        resumed_results = self._load_partial(partial_file_path)
+        resumed_urls = {normalize_url(data["url"]) for data in resumed_results}
+        url_list = [url for key, url in unique_urls.items() if key not in resumed_urls]
         logger.info(
-            f"Stage 2 - Content filtering and title generation completed in {time.time() - stage_time:.2f} seconds, with {len(results)} results"
+            f"Starting crawling process for {len(url_list)} URLs, {len(resumed_results)} pages resumed from {partial_file_path}"
         )
-        stage_time = time.time()
 
-        # Stage 3: Concurrent similarity scoring
-        results = await self._process_similarity_scores(results)
+        # Stage 1 - 3: crawl, filter and score, one browser shared by all URLs
+        async with AsyncWebCrawler() as crawler:
+            self._crawler = crawler
+            try:
+                results = resumed_results + await self._stream_pages(topic, url_list, partial_file_path)
+            finally:
+                self._crawler = None
         logger.info(
-            f"Stage 3 - Similarity scoring completed in {time.time() - stage_time:.2f} seconds, with {len(results)} results"
+            f"Stage 1 - 3 - Crawling, filtering and similarity scoring completed in {time.time() - process_start_time:.2f} seconds, with {len(results)} results"
         )
         stage_time = time.time()
+        if self.prefilter_top_k:
+            log_prefilter_recall(
+                "Page scoring",
+                [
+                    data["bm25_rank"]
+                    for data in results
+                    if "bm25_rank" in data and data["similarity"] >= self.DEFAULT_SIMILARITY_THRESHOLD
+                ],
+                self.prefilter_top_k,
+            )
 
         # Stage 4: Result processing and saving
         self._process_results(results, crawl_output_file_path, top_n=top_n)
@@ -92,6 +134,99 @@ class AsyncCrawler:
         logger.info(
             f"Total processing completed in {time.time() - process_start_time:.2f} seconds"
         )
+        if self.crawl_store is not None:
+            logger.info(f"Crawl store stats: {self.crawl_store.stats()}")
+
+    def _load_partial(self, partial_file_path: str) -> List[dict]:
+        """
+        Scored pages of an interrupted run, in the form _stream_pages returns them.
+        """
+        if not os.path.exists(partial_file_path):
+            return []
+        results = []
+        with open(partial_file_path, "r", encoding="utf-8") as infile:
+            for line in infile:
+                try:
+                    page = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a killed run may be cut
+                    continue
+                results.append(
+                    {
+                        "topic": page["topic"],
+                        "title": page["title"],
+                        "url": page["url"],
+                        "filtered": page["txt"],
+                        "similarity": page["similarity"],
+                        "error": False,
+                    }
+                )
+        return results
+
+    async def _stream_pages(self, topic: str, url_list: List[str], partial_file_path: str) -> List[dict]:
+        """
+        Crawl, filter and score pages with pipelined producer-consumer stages.
+        """
+        url_queue = asyncio.Queue()
+        dedup_queue = asyncio.Queue(maxsize=self.MAX_CONCURRENT_PROCESSES * 2)
+        filter_queue = asyncio.Queue(maxsize=self.MAX_CONCURRENT_PROCESSES * 2)
+        # the pre-filter ranks all crawled pages at once, so crawling feeds an unbounded queue then
+        crawled_queue = asyncio.Queue() if self.prefilter_top_k else filter_queue
+        similarity_queue = asyncio.Queue(maxsize=self.MAX_CONCURRENT_PROCESSES * 2)
+        output_queue = asyncio.Queue(maxsize=self.MAX_CONCURRENT_PROCESSES * 2)
+
+        # Producer: Add URLs to queue, None marks the end of the input
+        for url in url_list:
+            await url_queue.put({"topic": topic, "url": url})
+        await url_queue.put(None)
+
+        results = []
+
+        async def collect():
+            with open(partial_file_path, "a", encoding="utf-8") as outfile:
+                while (data := await output_queue.get()) is not None:
+                    results.append(data)
+                    json.dump(
+                        {
+                            "topic": data["topic"],
+                            "title": data["title"],
+                            "url": data["url"],
+                            "txt": data["filtered"],
+                            "similarity": data["similarity"],
+                        },
+                        outfile,
+                        ensure_ascii=False,
+                    )
+                    outfile.write("\n")
+                    outfile.flush()
+
+        await asyncio.gather(
+            self._run_stage(
+                "URL crawling",
+                lambda data: self._crawl_and_collect(data["url"], data["topic"]),
+                url_queue,
+                dedup_queue,
+                self.MAX_CONCURRENT_CRAWLS,
+            ),
+            self._dedup_stage(dedup_queue, crawled_queue),
+            self._prefilter_stage(topic, crawled_queue, filter_queue),
+            self._run_stage(
+                "Title and filter processing",
+                self._process_filter_and_title,
+                filter_queue,
+                similarity_queue,
+                self.MAX_CONCURRENT_PROCESSES,
+            ),
+            self._run_stage(
+                "Similarity scoring",
+                self._process_similarity_score,
+                similarity_queue,
+                output_queue,
+                self.MAX_CONCURRENT_PROCESSES,
+            ),
+            collect(),
+        )
+        return results
 
     async def _process_similarity_score(self, data):
         """
@@ -102,7 +237,7 @@ class AsyncCrawler:
             prompt = SIMILARITY_PROMPT.format(
                 topic=data["topic"], content=data["filtered"]
             )
-            res = self.request_pool.completion(prompt)
+            res = await self._acompletion(prompt)
 
             score = re.search(r"<SCORE>(\d+)</SCORE>", res)
             if not score:
@@ -125,7 +260,7 @@ class AsyncCrawler:
             prompt = PAGE_REFINE_PROMPT.format(
                 topic=data["topic"], raw_content=data["raw_content"]
             )
-            res = self.request_pool.completion(prompt)
+            res = await self._acompletion(prompt)
             title = re.search(r"<TITLE>(.*?)</TITLE>", res, re.DOTALL)
             content = re.search(r"<CONTENT>(.*?)</CONTENT>", res, re.DOTALL)
 
@@ -141,145 +276,93 @@ class AsyncCrawler:
             data["error"] = True
         return data
 
-    async def _process_similarity_scores(self, results: List[dict]) -> List[dict]:
-        """
-        Calculate similarity scores for filtered results using pure producer-consumer pattern.
-        """
-        input_queue = asyncio.Queue()
-        output_queue = asyncio.Queue()
-        total_items = len(results)
+    async def _acompletion(self, prompt):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.request_pool.completion, prompt
+        )
 
-        # Producer: Add tasks to queue
-        for data in results:
-            await input_queue.put(data)
+    async def _dedup_stage(self, input_queue, output_queue):
+        """
+        Drop crawled pages whose raw content is a near-duplicate (mirror, syndicated copy, another
+        rendering of the same paper) of an already forwarded page, before any LLM call is spent on them.
 
-        async def consumer():
-            while True:
-                try:
-                    data = input_queue.get_nowait()
-                    try:
-                        result = await self._process_similarity_score(data)
-                        await output_queue.put(result)
+        Pages are forwarded as they come, so a later copy clearly longer than the forwarded one is
+        forwarded too, every copy carries the duplicate_group of the first one and _process_results
+        keeps the best scored copy of each group.
+        """
+        index = NearDuplicateIndex(self.dedup_threshold) if self.dedup_threshold else None
+        best_length = {}
+        dropped_count = 0
+        while (data := await input_queue.get()) is not None:
+            if index is not None:
+                signature = index.signature(data["raw_content"])
+                matches = index.query(data["raw_content"], signature)
+                if not matches:
+                    data["duplicate_group"] = len(best_length)
+                    best_length[data["duplicate_group"]] = len(data["raw_content"])
+                    index.add(data["duplicate_group"], data["raw_content"], signature)
+                else:
+                    group, similarity = matches[0]
+                    data["duplicate_group"] = group
+                    if len(data["raw_content"]) <= best_length[group] * self.DUPLICATE_LENGTH_GAIN:
+                        dropped_count += 1
                         logger.info(
-                            f"Processed similarity score, remaining: {input_queue.qsize()}/{total_items}, URL: {data.get('url', 'N/A')}"
+                            f"Skip near-duplicate page ({similarity:.2f} similar to group {group}), URL: {data['url']}"
                         )
-                    finally:
-                        input_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
-
-        # Create and start consumers
-        consumers = [
-            asyncio.create_task(consumer())
-            for _ in range(self.MAX_CONCURRENT_PROCESSES)
-        ]
-
-        # Wait for all tasks to be processed
-        await input_queue.join()
-
-        # Collect results
-        results = []
-        while not output_queue.empty():
-            data = await output_queue.get()
-            if data["error"]:
-                logger.error(f"Error in processing data, skip: {data}")
-            else:
-                results.append(data)
-
-        return results
+                        continue
+                    best_length[group] = len(data["raw_content"])
+            await output_queue.put(data)
+        await output_queue.put(None)
+        if index is not None:
+            logger.info(
+                f"Near-duplicate detection dropped {dropped_count} crawled pages, saving {dropped_count * 2} LLM calls"
+            )
 
-    async def _process_filter_and_titles(self, results: List[dict]) -> List[dict]:
+    async def _prefilter_stage(self, topic, input_queue, output_queue):
         """
-        Process title generation and content filtering using pure producer-consumer pattern.
+        Wait for every crawled page, then forward the prefilter_top_k best pages by BM25 against the topic.
         """
-        input_queue = asyncio.Queue()
-        output_queue = asyncio.Queue()
-        total_items = len(results)
-
-        # Producer: Add tasks to queue
-        for data in results:
-            await input_queue.put(data)
-
-        async def consumer():
-            while True:
-                try:
-                    data = input_queue.get_nowait()
-                    try:
-                        result = await self._process_filter_and_title(data)
-                        await output_queue.put(result)
-                        logger.info(
-                            f"Title and filter processing completed, remaining: {input_queue.qsize()}/{total_items}, URL: {data.get('url', 'N/A')}"
-                        )
-                    finally:
-                        input_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
-
-        # Create and start consumers
-        consumers = [
-            asyncio.create_task(consumer())
-            for _ in range(self.MAX_CONCURRENT_PROCESSES)
-        ]
-
-        # Wait for all tasks to be processed
-        await input_queue.join()
-
-        # Collect results
-        results = []
-        while not output_queue.empty():
-            data = await output_queue.get()
-            if data["error"]:
-                logger.error(f"Error in processing data, skip: {data}")
-            else:
-                results.append(data)
-
-        return results
+        if input_queue is output_queue:
+            return
+        pages = []
+        while (data := await input_queue.get()) is not None:
+            pages.append(data)
+        kept = bm25_prefilter(
+            topic, [data["raw_content"] for data in pages], self.prefilter_top_k
+        )
+        for index, rank, _ in kept:
+            pages[index]["bm25_rank"] = rank
+            await output_queue.put(pages[index])
+        await output_queue.put(None)
 
-    async def _crawl_urls(self, topic: str, url_list: List[str]) -> List[dict]:
+    async def _run_stage(self, stage_name, process, input_queue, output_queue, worker_num):
         """
-        Crawl URLs using pure producer-consumer pattern.
+        Run worker_num consumers of input_queue until the None end marker, forward the results
+        without error to output_queue, then put the end marker to output_queue.
         """
-        input_queue = asyncio.Queue()
-        output_queue = asyncio.Queue()
-        total_items = len(url_list)
-
-        # Producer: Add URLs to queue
-        for url in url_list:
-            await input_queue.put((url, topic))
+        processed_count = 0
 
         async def consumer():
+            nonlocal processed_count
             while True:
-                try:
-                    url, topic = input_queue.get_nowait()
-                    try:
-                        result = await self._crawl_and_collect(url, topic)
-                        await output_queue.put(result)
-                        logger.info(
-                            f"URL crawling completed, remaining: {input_queue.qsize()}/{total_items}, URL: {url}"
-                        )
-                    finally:
-                        input_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
-
-        # Create and start consumers
-        consumers = [
-            asyncio.create_task(consumer()) for _ in range(self.MAX_CONCURRENT_CRAWLS)
-        ]
-
-        # Wait for all tasks to be processed
-        await input_queue.join()
-
-        # Collect results
-        results = []
-        while not output_queue.empty():
-            data = await output_queue.get()
-            if data["error"]:
-                logger.error(f"Error in processing data, skip: {data}")
-            else:
-                results.append(data)
+                data = await input_queue.get()
+                if data is None:
+                    # let the other consumers of this stage see the end marker as well
+                    await input_queue.put(None)
+                    return
+                result = await process(data)
+                processed_count += 1
+                logger.info(
+                    f"{stage_name} completed, processed: {processed_count}, URL: {data.get('url', 'N/A')}"
+                )
+                if result["error"]:
+                    logger.error(f"Error in processing data, skip: {result}")
+                else:
+                    await output_queue.put(result)
 
-        return results
+        await asyncio.gather(*[consumer() for _ in range(worker_num)])
+        await output_queue.put(None)
 
     async def _crawl_and_collect(self, url: str, topic: str) -> dict:
         """
@@ -313,7 +396,7 @@ class AsyncCrawler:
 
     async def _simple_crawl(self, url: str) -> str:
         """
-        Perform a simple crawl of a URL using AsyncWebCrawler.
+        Get the markdown of a URL, from the crawl store when it is fresh there, else with AsyncWebCrawler.
 
         Args:
             url (str): URL to crawl
@@ -321,47 +404,107 @@ class AsyncCrawler:
         Returns:
             str: Raw markdown content from the webpage
         """
+        raw_markdown = await self._fetch_markdown(url)
+        if raw_markdown is None:
+            return f"Error: Invalid crawl result for URL={url}"
+        return self._truncate_markdown(raw_markdown, url)
+
+    async def _fetch_markdown(self, url: str):
+        if self.crawl_store is None:
+            raw_markdown, _ = await self._crawl_page(url)
+            return raw_markdown
+
+        stored = self.crawl_store.get(url)
+        if stored is not None:
+            if stored["fresh"]:
+                self.crawl_store.hit_count += 1
+                logger.info(f"Crawl store hit for URL={url}")
+                return stored["raw_markdown"]
+            if await self._is_not_modified(url, stored):
+                self.crawl_store.revalidated_count += 1
+                self.crawl_store.touch(url)
+                logger.info(f"Crawl store revalidated URL={url}")
+                return stored["raw_markdown"]
+
+        self.crawl_store.miss_count += 1
+        raw_markdown, headers = await self._crawl_page(url)
+        if raw_markdown is not None:
+            self.crawl_store.put(url, raw_markdown, headers)
+        return raw_markdown
+
+    async def _crawl_page(self, url: str):
+        """
+        Crawl a URL with the shared AsyncWebCrawler, or a dedicated one outside of run().
+
+        Returns:
+            tuple: (raw markdown or None if the result is invalid, response headers)
+        """
         crawler_run_config = CrawlerRunConfig(
             page_timeout=180000, cache_mode=CacheMode.BYPASS  # 180s timeout
         )
 
-        async with AsyncWebCrawler() as crawler:
-            result = await crawler.arun(url=url, config=crawler_run_config)
-            if result and hasattr(result, 'markdown_v2') and result.markdown_v2:
-                raw_markdown = result.markdown_v2.raw_markdown
-                logger.info(f"Content length={len(raw_markdown)} for URL={url}")
-                
-                # Apply smart truncation if needed
-                max_length = int(os.getenv('LLM_MODEL_MAX_LENGTH', '150000'))
-                if len(raw_markdown) > max_length:
-                    logger.info(f"Content length={len(raw_markdown)} exceeds max_length={max_length}, truncating...")
-                    sections = re.split(r'(^#+.+$)', raw_markdown, flags=re.MULTILINE)
-                    truncated = []
-                    total_length = 0
+        if self._crawler is not None:
+            result = await self._crawler.arun(url=url, config=crawler_run_config)
+        else:
+            async with AsyncWebCrawler() as crawler:
+                result = await crawler.arun(url=url, config=crawler_run_config)
+
+        if result and hasattr(result, 'markdown_v2') and result.markdown_v2:
+            raw_markdown = result.markdown_v2.raw_markdown
+            logger.info(f"Content length={len(raw_markdown)} for URL={url}")
+            return raw_markdown, getattr(result, "response_headers", None) or {}
+        return None, {}
+
+    async def _is_not_modified(self, url: str, stored: dict) -> bool:
+        """
+        Conditional GET with the stored validators, True if the server answers 304 Not Modified.
+        """
+        headers = {}
+        if stored["etag"]:
+            headers["If-None-Match"] = stored["etag"]
+        if stored["last_modified"]:
+            headers["If-Modified-Since"] = stored["last_modified"]
+        if not headers:
+            return False
+        try:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+                response = await client.get(url, headers=headers)
+            return response.status_code == 304
+        except Exception as e:
+            logger.info(f"Revalidation failed for URL={url}: {e}")
+            return False
+
+    def _truncate_markdown(self, raw_markdown: str, url: str) -> str:
+        # Apply smart truncation if needed
+        max_length = int(os.getenv('LLM_MODEL_MAX_LENGTH', '150000'))
+        if len(raw_markdown) > max_length:
+            logger.info(f"Content length={len(raw_markdown)} exceeds max_length={max_length}, truncating...")
+            sections = re.split(r'(^#+.+$)', raw_markdown, flags=re.MULTILINE)
+            truncated = []
+            total_length = 0
+            
+            for section in sections:
+                if not section.strip():
+                    continue
                     
-                    for section in sections:
-                        if not section.strip():
-                            continue
-                            
-                        if section.startswith('#'):
-                            truncated.append(section)
-                            continue
-                            
-                        paragraphs = re.split(r'\n\n+', section)
-                        for para in paragraphs[:5]:  # Keep first 5 paragraphs per section
-                            if total_length + len(para) > max_length:
-                                break
-                            truncated.append(para)
-                            total_length += len(para)
-                            
-                        if total_length >= max_length:
-                            break
-                            
-                    raw_markdown = '\n\n'.join(truncated) + f"\n\n... [truncated from {len(raw_markdown)} chars to {max_length}]"
-                    logger.info(f"Truncated content to {len(raw_markdown)} chars for URL={url}")
+                if section.startswith('#'):
+                    truncated.append(section)
+                    continue
                     
-                return raw_markdown
-            return f"Error: Invalid crawl result for URL={url}"
+                paragraphs = re.split(r'\n\n+', section)
+                for para in paragraphs[:5]:  # Keep first 5 paragraphs per section
+                    if total_length + len(para) > max_length:
+                        break
+                    truncated.append(para)
+                    total_length += len(para)
+                    
+                if total_length >= max_length:
+                    break
+                    
+            raw_markdown = '\n\n'.join(truncated) + f"\n\n... [truncated from {len(raw_markdown)} chars to {max_length}]"
+            logger.info(f"Truncated content to {len(raw_markdown)} chars for URL={url}")
+            
+        return raw_markdown
 
     def _process_results(
         self,
@@ -384,9 +527,9 @@ class AsyncCrawler:
             max_length: Maximum document length
             minimal_length: Allowed minimum document length
         """
-        # Step 1: Process each paper data serially
+        # Step 1: Process each paper data serially, keeping the best copy of near-duplicates
         processed_data = []
-        for data in results:
+        for data in self._collapse_near_duplicates(results):
             try:
                 # Build paper data
                 paper_data = {
@@ -422,6 +565,35 @@ class AsyncCrawler:
 
         logger.info(f"Processed data has been saved to {output_path}")
 
+    def _collapse_near_duplicates(self, results):
+        """
+        Keep the best copy, by similarity then filtered length, of each duplicate_group of the crawl
+        stage and of the pages whose filtered contents are near-duplicates.
+        """
+        if not self.dedup_threshold:
+            return results
+        ranked = sorted(
+            results,
+            key=lambda data: (-data.get("similarity", 0), -len(data.get("filtered", ""))),
+        )
+        indexes = {}
+        kept_groups = set()
+        kept = []
+        for data in ranked:
+            group = (data.get("topic"), data.get("duplicate_group"))
+            if group[1] is not None and group in kept_groups:
+                continue
+            index = indexes.setdefault(data.get("topic"), NearDuplicateIndex(self.dedup_threshold))
+            if index.add_unique(len(kept), data.get("filtered", "")):
+                continue
+            kept_groups.add(group)
+            kept.append(data)
+        if len(kept) < len(results):
+            logger.info(f"Collapsed {len(results) - len(kept)} near-duplicate pages out of {len(results)}")
+        # keep the input order for the output
+        kept_ids = {id(data) for data in kept}
+        return [data for data in results if id(data) in kept_ids]
+
     def _filter_papers(
         self,
         papers,
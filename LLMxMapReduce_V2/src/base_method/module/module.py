@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Optional
 
-from gevent import spawn, joinall
+from gevent import GreenletExit, spawn, joinall, killall
 from gevent.lock import Semaphore
 
 from src.base_method.data import Dataset
+from src.data_structure import Survey
+from request.token_counter import label_greenlet
 import logging
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,16 @@ def parallel_semaphore_decorator(func):
     return wrapper
 
 
+def get_survey_title(args):
+    for arg in args:
+        if isinstance(arg, Survey):
+            return arg.title
+        survey_title = getattr(arg, "survey_title", None)
+        if isinstance(survey_title, str):
+            return survey_title
+    return None
+
+
 class Module(ABC):
     _parallel_count = 20
 
@@ -33,28 +45,34 @@ class Module(ABC):
             except Exception as e:
                 return e
             
+        tasks = []
         try:
             if len(args) == 1 and isinstance(args[0], Dataset):
-                tasks = []
                 batch_data = args[0]
                 for data in batch_data:
-                    tasks.append(
-                        spawn(
-                            self.forward, *data, **kwargs
-                        )
-                    )
+                    tasks.append(self._spawn_forward(*data, **kwargs))
                 joinall(tasks)
                 return [get_task_result(task) for task in tasks]
             else:
-                task = spawn(
-                    self.forward, *args, **kwargs
-                )
+                task = self._spawn_forward(*args, **kwargs)
+                tasks.append(task)
                 task.join()
                 return get_task_result(task)
+        except GreenletExit:
+            # the caller was killed (e.g. an early stopped refine candidate), so are the forwards
+            # it spawned, down to their in-flight LLM calls
+            killall(tasks)
+            raise
         except Exception as e:
             logger.error(f"Error in {self.__name__}: {e}")
             raise
 
+    def _spawn_forward(self, *args, **kwargs):
+        task = spawn(self.forward, *args, **kwargs)
+        # the task has not started yet, LLM calls inside it are accounted to this module and survey
+        label_greenlet(task, neuron=self.__name__, survey=get_survey_title(args))
+        return task
+
     @abstractmethod
     @parallel_semaphore_decorator
     def forward(self, *args, **kwargs):
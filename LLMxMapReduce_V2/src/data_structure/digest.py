@@ -14,6 +14,15 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def get_section_path(section):
+    """Normalized titles from the root to the section, identifies a section across outline versions."""
+    path = []
+    while section is not None:
+        path.append(re.sub(r"\s+", " ", section.title.lower()).strip())
+        section = section.father
+    return tuple(reversed(path))
+
+
 class DigestNode(TreeNode):
     def __init__(self, title, description=""):
         super().__init__()
@@ -152,6 +161,30 @@ class Digest:
             raise e
         return self
 
+    def carry_forward(self, outline):
+        """
+        Rebuild the digest against a new outline without requesting the model: sections whose title
+        path is unchanged keep their description, the others are left empty.
+        """
+        descriptions = {
+            get_section_path(section): section.description.strip()
+            for section in self.root.all_section
+        }
+        lines = []
+        for section in outline.root.all_section:
+            lines.append(section.get_skeleton_title(with_index=True).strip())
+            description = descriptions.get(get_section_path(section), "")
+            if description:
+                lines.append(description)
+
+        new_digest = Digest([], self.survey_title)
+        # copies: get_paper_infos shuffles the list and SingleDigestModule rewrites "content".
+        # The suggestions were made against the previous outline, they are not carried.
+        new_digest.paper_infos = [dict(paper_info) for paper_info in self.paper_infos]
+        return new_digest.parse_raw_digest(
+            "```markdown\n" + "\n".join(lines) + "\n```", outline
+        )
+
     def parse_suggestion(self, raw_result, bibkey):
         old_suggestions = self.suggestions
         try:
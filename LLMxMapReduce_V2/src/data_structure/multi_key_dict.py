@@ -1,22 +1,31 @@
-
 from typing import List, Set
 
 class MultiKeyDict:
     # multiple key could correspond to one value, used in multiple bibkey to find one digest
     def __init__(self):
         self._data = {}
+        # bibkey -> key groups holding it, in insertion order, so the first group wins as with a scan
+        self._index = {}
+        self._keys_cache = None
 
     def add(self, keys: Set[str], value):
-        self._data[frozenset(keys)] = value
+        keys = frozenset(keys)
+        if keys not in self._data:
+            for key in keys:
+                self._index.setdefault(key, []).append(keys)
+            self._keys_cache = None
+        self._data[keys] = value
 
     def get(self, key: str):
-        for keys, digest in self._data.items():
-            if key in keys:
-                return digest
+        groups = self._index.get(key)
+        if groups:
+            return self._data[groups[0]]
         return None
 
     def keys(self):
-        return {key for keys in self._data.keys() for key in keys}
+        if self._keys_cache is None:
+            self._keys_cache = frozenset(self._index)
+        return self._keys_cache
 
     def values(self):
         return self._data.values()
@@ -34,13 +43,20 @@ class MultiKeyDict:
             return self._data[key]
 
     def __delitem__(self, key: str):
-        for keys in list(self._data.keys()):
-            if key in keys:
-                del self._data[keys]
-                break
+        groups = self._index.get(key)
+        if not groups:
+            return
+        keys = groups[0]
+        del self._data[keys]
+        for bibkey in keys:
+            bibkey_groups = self._index[bibkey]
+            bibkey_groups.remove(keys)
+            if not bibkey_groups:
+                del self._index[bibkey]
+        self._keys_cache = None
 
     def __contains__(self, key: str):
-        return any(key in keys for keys in self._data.keys())
+        return key in self._index
 
     def __iter__(self):
         return iter(self.keys())
@@ -50,6 +66,8 @@ class MultiKeyDict:
 
     def clear(self):
         self._data.clear()
+        self._index.clear()
+        self._keys_cache = None
 
     def update(self, *args, **kwargs):
         for keys, value in dict(*args, **kwargs).items():
@@ -13,6 +13,8 @@ from src.utils.process_str import proc_title_to_str
 class Survey:
     def __init__(self, json_data):
         self.title = json_data["title"]
+        # unique in a run even for surveys of the same title, set by EncodePipeline from the input line
+        self.survey_id = json_data.get("survey_id", None)
         self.origin_outline = json_data.get("outline", [])
         self.origin_outline = "\n".join(self.origin_outline)
         self.origin_content = json_data.get("txt", "")
@@ -107,6 +109,7 @@ class Survey:
             
         return {
             "title": self.title,
+            "survey_id": self.survey_id,
             "cost_time": readable_time,
             "block_cycle_count": self.block_cycle_count,
             "block_avg_score": self.block_avg_score,
@@ -113,36 +113,12 @@ class DecodePipeline(Sequential):
             raise ValueError(f"Invalid survey type, current data type {type(survey)}")
 
     def change_bibkey_to_index(self, survey):
-        cite_reg = re.compile(r"\[([^\]]+)\]")
-        bibkeys = list(survey.papers.keys())
-        bibkey_count_dict = {bibkey: 0 for bibkey in bibkeys}
-        for content_section in survey.content.root.all_section:
-
-            def replace_bibkey(match):
-                bibkey_str = match.group(1)
-                bibkey_list = str2list(bibkey_str)
-                indices = []
-                for bibkey in bibkey_list:
-                    bibkey = bibkey.strip().replace("-", "_")
-                    try:
-                        bibkey_count_dict[bibkey] += 1
-                        indices.append(bibkeys.index(bibkey) + 1)
-                    except Exception as e:
-                        pass
-                indices = list(set(indices))
-                indices = sorted(indices)
-                indices = [str(index) for index in indices]
-                if indices:
-                    return f"[{','.join(indices)}]"
-                else:
-                    return ""
-
-            content_section.content = remove_illegal_bibkeys(
-                content_section.content, legal_bibkeys=bibkeys
-            )
-            content_section.content = cite_reg.sub(
-                replace_bibkey, content_section.content
-            )
+        sections = list(survey.content.root.all_section)
+        contents = [content_section.content for content_section in sections]
+        bibkey_index = {bibkey: i + 1 for i, bibkey in enumerate(survey.papers.keys())}
+        contents, bibkey_count_dict = cite_contents(contents, bibkey_index)
+        for content_section, content in zip(sections, contents):
+            content_section.content = content
 
         # 统计没有被引用的论文比例
         not_cited_count = sum(1 for count in bibkey_count_dict.values() if count == 0)
@@ -161,3 +137,40 @@ class DecodePipeline(Sequential):
             survey_file.write(json.dumps(survey.to_dict(), ensure_ascii=False))
             survey_file.write("\n")
             logger.info(f"Survey {survey.title} saved.")
+
+
+def cite_contents(contents, bibkey_index):
+    """
+    Replace the bibkeys cited in every content by their index in the references.
+
+    contents: section contents, bibkey_index: {bibkey: index in the references, from 1}
+    return: the new contents and the citation count of every bibkey
+    """
+    cite_reg = re.compile(r"\[([^\]]+)\]")
+    bibkeys = list(bibkey_index.keys())
+    bibkey_count_dict = {bibkey: 0 for bibkey in bibkeys}
+
+    def replace_bibkey(match):
+        bibkey_str = match.group(1)
+        bibkey_list = str2list(bibkey_str)
+        indices = []
+        for bibkey in bibkey_list:
+            bibkey = bibkey.strip().replace("-", "_")
+            try:
+                bibkey_count_dict[bibkey] += 1
+                indices.append(bibkey_index[bibkey])
+            except Exception as e:
+                pass
+        indices = list(set(indices))
+        indices = sorted(indices)
+        indices = [str(index) for index in indices]
+        if indices:
+            return f"[{','.join(indices)}]"
+        else:
+            return ""
+
+    new_contents = []
+    for content in contents:
+        content = remove_illegal_bibkeys(content, legal_bibkeys=bibkeys)
+        new_contents.append(cite_reg.sub(replace_bibkey, content))
+    return new_contents, bibkey_count_dict
@@ -12,11 +12,17 @@ logger = logging.getLogger(__name__)
 
 
 class EncodePipeline(Sequential):
-    def __init__(self, configs, data_num, worker_num=1):
+    def __init__(self, configs, data_num, worker_num=1, checkpoint_store=None):
         self.configs = configs
         self.worker_num = worker_num
         self.data_num = data_num
+        # surveys already in the checkpoint store are resumed from there instead
+        self.checkpoint_store = checkpoint_store
         self.processed_count = 0
+        # surveys yielded (survey_id: title) and input files read to the end, to tell when every
+        # input survey is done
+        self.loaded_surveys = {}
+        self.loaded_file_count = 0
         self._count_lock = Lock()
 
         self.load_node = Node(
@@ -37,7 +43,7 @@ class EncodePipeline(Sequential):
 
     def load_survey(self, input_file):
         with FileObject(input_file, "r") as f:
-            for line in f:
+            for line_index, line in enumerate(f):
                 with self._count_lock:
                     if self.data_num is not None:
                         if self.processed_count >= self.data_num:
@@ -45,17 +51,27 @@ class EncodePipeline(Sequential):
                         self.processed_count += 1
                 
                 survey = Survey(json.loads(line))
+                if survey.survey_id is None:
+                    survey.survey_id = f"{input_file}:{line_index}"
+                if self.checkpoint_store is not None and self.checkpoint_store.has(survey.title):
+                    logger.info(
+                        f"Survey {survey.title} has a checkpoint, skip loading it from input file."
+                    )
+                    continue
                 if len(survey.papers) == 0:
                     logger.error(
                         f"Survey {survey.survey_id} has no papers, "
                         f"skipping this survey."
                     )
                     continue
+                with self._count_lock:
+                    self.loaded_surveys[survey.survey_id] = survey.title
                 yield survey
             else:
                 logger.info("All data in input file has been loaded.")
         
         with self._count_lock:
+            self.loaded_file_count += 1
             if self.data_num is not None and self.processed_count < self.data_num:
                 logger.warning(
                     f"Only {self.processed_count} data in input file, "
@@ -5,6 +5,7 @@ from request import RequestWrapper
 from src.base_method.module import Neuron, Module
 from src.base_method.data import Dataset
 from src.data_structure import Digest, Survey
+from src.data_structure.digest import get_section_path
 from src.exceptions import (
     BibkeyNotFoundError,
     StructureNotCorrespondingError,
@@ -27,15 +28,64 @@ class DigestModule(Module):
     def __init__(self, config):
         super().__init__()
         self.module = SingleDigestModule(config)
+        self.incremental = config.get("incremental", False)
 
     def forward(self, survey: Survey):
         outline = survey.skeleton
-        dataset = Dataset([(digest, outline) for digest in survey.digests.values()])
-        digest_list = self.module(dataset)
-        survey.update_digests(digest_list)
+        digests = list(survey.digests.values())
+        if self.incremental:
+            affected_bibkeys = self.get_affected_bibkeys(digests, outline)
+        else:
+            affected_bibkeys = None
+
+        regen_digests = []
+        carried_digests = []
+        for digest in digests:
+            if affected_bibkeys is None or digest.bibkeys & affected_bibkeys:
+                regen_digests.append(digest)
+            else:
+                try:
+                    carried_digests.append(digest.carry_forward(outline))
+                except (StructureNotCorrespondingError, BibkeyNotFoundError, MdNotFoundError):
+                    # the carried digest does not fit the new outline, ask the model again
+                    regen_digests.append(digest)
+
+        if carried_digests:
+            logger.info(
+                f"Incremental Digest: Survey: {survey.title}, regenerate {len(regen_digests)}/{len(digests)} digests, carry forward the others"
+            )
+        dataset = Dataset([(digest, outline) for digest in regen_digests])
+        digest_list = self.module(dataset) if regen_digests else []
+        survey.update_digests(digest_list + carried_digests)
         logger.info(f"All Digest Finished: Survey: {survey.title}")
         return survey
 
+    def get_affected_bibkeys(self, digests, outline):
+        """
+        Bibkeys cited by the sections that are new in the outline (added, renamed or moved under
+        another parent). None means every digest has to be regenerated.
+        """
+        if not digests or any(digest.root is None for digest in digests):
+            return None
+
+        old_paths = {
+            get_section_path(section)
+            for digest in digests
+            for section in digest.root.all_section
+        }
+        affected_bibkeys = set()
+        for section in outline.root.all_section:
+            if get_section_path(section) in old_paths:
+                continue
+            cited_bibkeys = set()
+            for ref in re.findall(r"\[(.*?)\]", section.description):
+                cited_bibkeys.update(str2list(ref))
+            if not cited_bibkeys:
+                # nothing tells which papers feed this section
+                return None
+            affected_bibkeys |= cited_bibkeys
+        return affected_bibkeys
+
 
 class SingleDigestModule(Module):
     def __init__(self, config):
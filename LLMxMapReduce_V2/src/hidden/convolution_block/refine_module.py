@@ -1,5 +1,7 @@
+import time
 import logging
 import random
+import gevent
 import numpy as np
 import math
 import json
@@ -7,6 +9,7 @@ from typing import List
 from src.base_method.module import Module
 from src.base_method.data import Dataset
 from src.data_structure import Survey
+from request import RequestWrapper
 from src.hidden.convolution_block.neurons import (
     SelfRefineNeuron,
     ModifyOutlineNeuron,
@@ -16,12 +19,30 @@ from src.hidden.convolution_block.neurons import (
 logger = logging.getLogger(__name__)
 
 class SelfRefineModule(Module):
+    """
+    Refine the outline refine_count times, keeping the best of best_of candidates each round.
+
+    With config["early_stop"] a round stops waiting for (and kills) the outstanding candidates
+    once enough candidates finished and one of them reaches score_threshold, beats the runner-up
+    by dominance_margin, or once the round exceeded time_budget seconds or token_budget tokens.
+    Without it every candidate is awaited.
+    """
+
+    POLL_INTERVAL = 1  # seconds, how often the budgets are checked while waiting
+
     def __init__(self, config, refine_count, best_of):
         super().__init__()
         self.refine_count = refine_count
         self.best_of = best_of
         self.single_refine_module = SingleRefineModule(config)
 
+        early_stop = config.get("early_stop") or {}
+        self.score_threshold = early_stop.get("score_threshold")
+        self.dominance_margin = early_stop.get("dominance_margin")
+        self.min_candidates = early_stop.get("min_candidates") or 1
+        self.time_budget = early_stop.get("time_budget")
+        self.token_budget = early_stop.get("token_budget")
+
     def forward(self, survey: Survey) -> List[float]:
         title = survey.title
         bibkeys = survey.papers.keys()
@@ -36,14 +57,15 @@ class SelfRefineModule(Module):
             logger.info(
                 f"Self-refine module: Survey {survey.title} refine count: {i} start, best of {self.best_of}"
             )
-            new_outlines = self.single_refine_module(
-                Dataset(
-                    [
-                        (title, old_outline, eval_detail, bibkeys)
-                        for _ in range(self.best_of)
-                    ],
-                )
+            new_outlines = self.refine_round(
+                title, (title, old_outline, eval_detail, bibkeys)
             )
+            if not new_outlines:
+                logger.warning(
+                    f"Self-refine module: Survey {survey.title} refine count: {i} end, no candidate succeeded, keep the previous outline"
+                )
+                self_refine_score.append([])
+                continue
 
             new_outlines = sorted(
                 new_outlines, key=lambda x: x.eval_score, reverse=True
@@ -65,6 +87,79 @@ class SelfRefineModule(Module):
         survey.refine_count = self.refine_count
         return survey
 
+    def refine_round(self, title, refine_args):
+        if not self.early_stop_enabled():
+            return [
+                outline
+                for outline in self.single_refine_module(
+                    Dataset([refine_args for _ in range(self.best_of)])
+                )
+                if not isinstance(outline, Exception)
+            ]
+
+        usage_tracker = RequestWrapper.usage_tracker()
+        start_time = time.time()
+        start_tokens = usage_tracker.survey_tokens(title)
+        pending = [
+            self.single_refine_module._spawn_forward(*refine_args)
+            for _ in range(self.best_of)
+        ]
+        finished = []
+        while pending:
+            for task in gevent.wait(pending, timeout=self.POLL_INTERVAL, count=1):
+                pending.remove(task)
+                if task.successful():
+                    finished.append(task.value)
+                else:
+                    logger.warning(f"Self-refine candidate failed: Survey {title}: {task.exception}")
+
+            reason = self.stop_reason(
+                finished,
+                time.time() - start_time,
+                usage_tracker.survey_tokens(title) - start_tokens,
+            )
+            if pending and reason is not None:
+                logger.info(
+                    f"Self-refine module: Survey {title} stop {len(pending)} outstanding candidates, {reason}"
+                )
+                # Module.__call__ kills the neurons a killed candidate spawned, with their LLM calls
+                gevent.killall(pending, block=False)
+                break
+        return finished
+
+    def early_stop_enabled(self):
+        return any(
+            value is not None
+            for value in (
+                self.score_threshold,
+                self.dominance_margin,
+                self.time_budget,
+                self.token_budget,
+            )
+        )
+
+    def stop_reason(self, finished, elapsed_time, used_tokens):
+        # a round always waits for at least one candidate, otherwise there is nothing to keep
+        if not finished:
+            return None
+        if self.time_budget is not None and elapsed_time >= self.time_budget:
+            return f"time budget {self.time_budget}s exceeded ({elapsed_time:.1f}s)"
+        if self.token_budget is not None and used_tokens >= self.token_budget:
+            return f"token budget {self.token_budget} exceeded ({used_tokens})"
+        if len(finished) < self.min_candidates:
+            return None
+
+        scores = sorted((outline.eval_score for outline in finished), reverse=True)
+        if self.score_threshold is not None and scores[0] >= self.score_threshold:
+            return f"score {scores[0]} reached threshold {self.score_threshold}"
+        if (
+            self.dominance_margin is not None
+            and len(scores) > 1
+            and scores[0] - scores[1] >= self.dominance_margin
+        ):
+            return f"score {scores[0]} dominates runner-up {scores[1]}"
+        return None
+
 
 class SingleRefineModule(Module):
     def __init__(self, config):
@@ -33,6 +33,7 @@ QUERY_EXPAND_PROMPT_WITHOUT_ABSTRACT = (
 )
 LLM_CHECK_PROMPT = _default_manager.prompts.LLM_CHECK_PROMPT
 SNIPPET_FILTER_PROMPT = _default_manager.prompts.SNIPPET_FILTER_PROMPT
+SNIPPET_FILTER_BATCH_PROMPT = _default_manager.prompts.SNIPPET_FILTER_BATCH_PROMPT
 
 # Crawl related prompts
 PAGE_REFINE_PROMPT = _default_manager.prompts.PAGE_REFINE_PROMPT
@@ -36,6 +36,7 @@ class PromptsProtocol(Protocol):
     QUERY_EXPAND_PROMPT_WITHOUT_ABSTRACT: str
     LLM_CHECK_PROMPT: str
     SNIPPET_FILTER_PROMPT: str
+    SNIPPET_FILTER_BATCH_PROMPT: str
 
     # Crawl related prompts
     PAGE_REFINE_PROMPT: str
@@ -749,6 +749,23 @@ Reason:...
 Similarity score: <SCORE>89</SCORE> 
 """
 
+SNIPPET_FILTER_BATCH_PROMPT = """Please infer the degree of relevance between each of the following web pages and the topic based on the topic and the web page snippets retrieved from the Internet.
+
+Topic: {topic}
+Web page snippets ({count} in total, each one starts with its number in square brackets):
+{snippets}
+
+Score every snippet independently. The scoring range is from 0 to 100. 0 means completely irrelevant, and 100 means completely relevant. Please be as strict as possible when scoring.
+
+For each snippet, give a short reason, then its score enclosed in <SCORE id="number"></SCORE>, where number is the number of the snippet. Every snippet must receive exactly one score.
+
+Example response:
+[1] Reason:...
+<SCORE id="1">89</SCORE>
+[2] Reason:...
+<SCORE id="2">12</SCORE>
+"""
+
 # crawl4ai prompts
 PAGE_REFINE_PROMPT = """Analyze and process the following web page content related to '{topic}'. Output the main body text, removing image links, website URLs, advertisements, meaningless repeated characters, etc. Summarization of the content is prohibited, and all information related to the topic should be retained.
 
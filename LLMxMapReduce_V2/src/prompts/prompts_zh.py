@@ -734,6 +734,23 @@ SNIPPET_FILTER_PROMPT="""请你依据下列主题和在互联网上检索到的
 相似度评分：<SCORE>89</SCORE>
 """
 
+SNIPPET_FILTER_BATCH_PROMPT="""请你依据下列主题和在互联网上检索到的多个网页片段，分别推测每个网页与主题的相关程度。
+
+主题：{topic}
+网页片段（共{count}个，每个片段以方括号中的编号开头）：
+{snippets}
+
+请你对每个片段独立评分。评分范围是0-100。0表示完全不相关，100表示完全相关。请你评分尽可能严格。
+
+对每个片段，先简要给出评分的理由，再给出评分，评分需要用<SCORE id="编号"></SCORE>包裹起来，其中编号为该片段的编号。每个片段必须有且只有一个评分。
+
+回答示例：
+[1] 理由：...
+<SCORE id="1">89</SCORE>
+[2] 理由：...
+<SCORE id="2">12</SCORE>
+"""
+
 
 # crawl4ai prompts
 PAGE_REFINE_PROMPT="""分析并处理以下与‘{topic}’相关的网页内容。输出主体文本，去除图片链接，网址链接，广告，无意义重复字符等。禁止对内容进行总结，应保留所有与主题相关的信息。
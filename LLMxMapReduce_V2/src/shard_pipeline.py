@@ -0,0 +1,292 @@
+"""
+Shard an input JSONL across worker processes, each running its own EntirePipeline through
+start_pipeline.py, and merge their outputs, LLM usage and metrics.
+
+One machine, one worker per shard:
+    python src/shard_pipeline.py --input_file data.jsonl --output_file output/result.jsonl --num_shards 8 \
+        --parallel_num 2 --block_count 1
+
+Several machines sharing --shard_dir (e.g. NFS): every machine splits the input the same way and runs
+the shards it is given, then any one of them merges once every shard is done:
+    machine A: python src/shard_pipeline.py ... --num_shards 8 --shard_ids 0,1,2,3
+    machine B: python src/shard_pipeline.py ... --num_shards 8 --shard_ids 4,5,6,7
+    machine A: python src/shard_pipeline.py ... --num_shards 8 --merge_only
+
+Arguments not listed below are passed to every worker as they are.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+START_PIPELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "start_pipeline.py")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run EntirePipeline over shards of the input file in several processes or machines."
+    )
+    parser.add_argument("--input_file", type=str, required=True,
+        help="Input JSONL file, one survey per line")
+    parser.add_argument("--output_file", type=str, required=True,
+        help="Path of the merged output of every shard")
+    parser.add_argument("--num_shards", type=int, default=os.cpu_count() or 1,
+        help="Number of shards, one worker process each (type: int, default: number of CPUs)")
+    parser.add_argument("--shard_dir", type=str, default=None,
+        help="Directory of the shard inputs, outputs, logs and done markers, shared between machines\n"
+             "(type: str, default: <output_file without extension>_shards)")
+    parser.add_argument("--shard_ids", type=str, default=None,
+        help="Comma separated shards run on this machine (type: str, default: all shards)")
+    parser.add_argument("--merge_only", action="store_true",
+        help="Run no worker, wait for every shard to be done and merge their outputs")
+    parser.add_argument("--poll_interval", type=float, default=10,
+        help="Seconds between two checks of the workers and merges of the monitoring (type: float, default: 10)")
+    parser.add_argument("--data_num", type=int, default=None,
+        help="Number of surveys taken from the input file before sharding, as in start_pipeline.py")
+    parser.add_argument("--checkpoint_dir", type=str, default=None,
+        help="Checkpoint directory, every shard checkpoints into its own sub-directory")
+    parser.add_argument("--usage_file", type=str, default=None,
+        help="Merged LLM usage of every shard (type: str, default: <output_file without extension>_usage.json)")
+    parser.add_argument("--metrics_textfile", type=str, default=None,
+        help="Merged Prometheus textfile of every shard, with a shard label (type: str, default: None)")
+    parser.add_argument("--metrics_port", type=int, default=None,
+        help="Shard i serves its own metrics on metrics_port + i (type: int, default: None)")
+    return parser.parse_known_args()
+
+
+def shard_paths(shard_dir, shard_id):
+    prefix = os.path.join(shard_dir, f"shard_{shard_id}")
+    return {
+        "input": prefix + "_input.jsonl",
+        "output": prefix + "_output.jsonl",
+        "usage": prefix + "_usage.json",
+        "metrics": prefix + "_metrics.prom",
+        "log": prefix + ".log",
+        "done": prefix + ".done",
+        "checkpoint": prefix + "_checkpoint",
+    }
+
+
+def write_atomic(path, content):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+
+
+def split_input(input_file, shard_dir, num_shards, data_num=None):
+    """
+    Split the surveys into num_shards files of balanced size, the largest survey going to the
+    currently lightest shard. The split only depends on the input, so every machine gets the same.
+    """
+    with open(input_file, "r", encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    if data_num is not None:
+        lines = lines[:data_num]
+
+    loads = [0] * num_shards
+    assigned = [[] for _ in range(num_shards)]
+    for index in sorted(range(len(lines)), key=lambda i: len(lines[i]), reverse=True):
+        shard_id = loads.index(min(loads))
+        loads[shard_id] += len(lines[index])
+        assigned[shard_id].append(index)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    for shard_id, indices in enumerate(assigned):
+        content = "".join(
+            lines[i] if lines[i].endswith("\n") else lines[i] + "\n" for i in sorted(indices)
+        )
+        write_atomic(shard_paths(shard_dir, shard_id)["input"], content)
+    logger.info(
+        f"Split {len(lines)} surveys of {input_file} into {num_shards} shards of "
+        f"{[len(indices) for indices in assigned]} surveys in {shard_dir}"
+    )
+    return [len(indices) for indices in assigned]
+
+
+def read_done(paths):
+    if not os.path.exists(paths["done"]):
+        return None
+    with open(paths["done"], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def start_worker(shard_id, paths, args, worker_args):
+    command = [
+        sys.executable,
+        START_PIPELINE,
+        "--input_file", paths["input"],
+        "--output_file", paths["output"],
+        "--usage_file", paths["usage"],
+        "--metrics_textfile", paths["metrics"],
+        "--exit_on_finish",
+    ]
+    if args.checkpoint_dir:
+        command += [
+            "--checkpoint_dir", os.path.join(args.checkpoint_dir, f"shard_{shard_id}"),
+            "--resume",
+        ]
+    elif os.path.exists(paths["output"]):
+        # without checkpoints the shard runs again from scratch, drop the output of the failed run
+        os.remove(paths["output"])
+    if args.metrics_port is not None:
+        command += ["--metrics_port", str(args.metrics_port + shard_id)]
+    command += worker_args
+
+    log_file = open(paths["log"], "a", encoding="utf-8")
+    process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+    logger.info(f"Shard {shard_id} started, pid {process.pid}, log {paths['log']}")
+    return process, log_file
+
+
+def merge_usage(snapshots):
+    """Sum the usage dumps of every shard, numbers are added key by key at every level."""
+
+    def merge(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict):
+                merge(target.setdefault(key, {}), value)
+            elif isinstance(value, (int, float)):
+                target[key] = target.get(key, 0) + value
+        return target
+
+    merged = {}
+    for snapshot in snapshots:
+        merge(merged, snapshot)
+    return merged
+
+
+SAMPLE_REG = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})?\s+(.*)$")
+
+
+def merge_metrics(texts):
+    """
+    Merge the Prometheus textfiles of the shards into one, every sample gets a shard label
+    and the HELP/TYPE lines of a family are kept once.
+
+    Args:
+        texts: {shard_id: textfile content}
+    """
+    families = {}
+    for shard_id, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split()[2]
+                entry = families.setdefault(family, {"HELP": None, "TYPE": None, "samples": []})
+                entry[line.split()[1]] = line
+                continue
+            match = SAMPLE_REG.match(line)
+            if not match or family is None:
+                continue
+            name, _, labels, value = match.groups()
+            labels = f'shard="{shard_id}",{labels}' if labels else f'shard="{shard_id}"'
+            families[family]["samples"].append(f"{name}{{{labels}}} {value}")
+
+    lines = []
+    for entry in families.values():
+        lines.extend(line for line in (entry["HELP"], entry["TYPE"]) if line)
+        lines.extend(entry["samples"])
+    return "\n".join(lines) + "\n"
+
+
+def aggregate_monitoring(all_paths, usage_file, metrics_textfile):
+    snapshots = []
+    for paths in all_paths.values():
+        try:
+            with open(paths["usage"], "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    write_atomic(usage_file, json.dumps(merge_usage(snapshots), ensure_ascii=False, indent=2))
+
+    if metrics_textfile:
+        texts = {}
+        for shard_id, paths in all_paths.items():
+            if os.path.exists(paths["metrics"]):
+                with open(paths["metrics"], "r", encoding="utf-8") as f:
+                    texts[shard_id] = f.read()
+        write_atomic(metrics_textfile, merge_metrics(texts))
+
+
+def merge_outputs(all_paths, output_file):
+    if os.path.dirname(output_file):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    survey_count = 0
+    with open(output_file + ".tmp", "w", encoding="utf-8") as out:
+        for shard_id, paths in all_paths.items():
+            if not os.path.exists(paths["output"]):
+                logger.warning(f"Shard {shard_id} has no output")
+                continue
+            with open(paths["output"], "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        out.write(line if line.endswith("\n") else line + "\n")
+                        survey_count += 1
+    os.replace(output_file + ".tmp", output_file)
+    logger.info(f"Merged {survey_count} surveys of {len(all_paths)} shards into {output_file}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args, worker_args = parse_args()
+    shard_dir = args.shard_dir or os.path.splitext(args.output_file)[0] + "_shards"
+    usage_file = args.usage_file or os.path.splitext(args.output_file)[0] + "_usage.json"
+    all_paths = {shard_id: shard_paths(shard_dir, shard_id) for shard_id in range(args.num_shards)}
+
+    local_ids = []
+    if not args.merge_only:
+        split_input(args.input_file, shard_dir, args.num_shards, args.data_num)
+        local_ids = (
+            [int(shard_id) for shard_id in args.shard_ids.split(",")]
+            if args.shard_ids
+            else list(all_paths)
+        )
+
+    workers = {}
+    for shard_id in local_ids:
+        paths = all_paths[shard_id]
+        done = read_done(paths)
+        if done is not None and done["returncode"] == 0:
+            logger.info(f"Shard {shard_id} already done, skip it")
+            continue
+        if done is not None:
+            os.remove(paths["done"])
+        workers[shard_id] = start_worker(shard_id, paths, args, worker_args)
+
+    while True:
+        for shard_id, (process, log_file) in list(workers.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            log_file.close()
+            write_atomic(all_paths[shard_id]["done"], json.dumps({"returncode": returncode}))
+            if returncode == 0:
+                logger.info(f"Shard {shard_id} done")
+            else:
+                logger.error(f"Shard {shard_id} exited with code {returncode}, see {all_paths[shard_id]['log']}")
+            workers.pop(shard_id)
+
+        aggregate_monitoring(all_paths, usage_file, args.metrics_textfile)
+        pending = [shard_id for shard_id, paths in all_paths.items() if read_done(paths) is None]
+        if not pending:
+            break
+        if not workers and not args.merge_only:
+            logger.info(f"Local shards done, shards {pending} run elsewhere, merge them later with --merge_only")
+            return
+        time.sleep(args.poll_interval)
+
+    merge_outputs(all_paths, args.output_file)
+    failed = [shard_id for shard_id, paths in all_paths.items() if read_done(paths)["returncode"] != 0]
+    if failed:
+        logger.error(f"Shards {failed} failed, their output is partial. Run again to retry them.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
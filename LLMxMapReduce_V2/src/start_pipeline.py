@@ -1,30 +1,56 @@
 import os
+import glob
 import json
+import time
+import atexit
 import logging
+import functools
 import gevent
 from args import parse_args
 import asyncio
 from datetime import datetime
 
 from async_d import Monitor, PipelineAnalyser
-from async_d import Pipeline
+from async_d import Node, Pipeline
+from async_d.exceptions import NodeProcessingError
+from request import RequestWrapper, RateLimiter
+from request.analyser import RequestAnalyser
 from src.decode.decode_pipeline import DecodePipeline
 from src.encode.encode_pipeline import EncodePipeline
 from src.hidden.hidden_pipeline import HiddenPipeline
 from src.LLM_search import LLM_search
 from src.async_crawl import AsyncCrawler
+from src.data_structure import Survey
+from src.base_method.module.module import get_survey_title
+from src.utils.checkpoint import CheckpointStore
+from src.utils.crawl_store import CrawlStore
+from src.utils.search_cache import SearchCache
 
 logger = logging.getLogger(__name__)
 
 
+def survey_id_of(survey):
+    # surveys checkpointed before survey_id existed are known by their title
+    return getattr(survey, "survey_id", None) or survey.title
+
+
 class EntirePipeline(Pipeline):
-    def __init__(self, args):
+    def __init__(self, args, checkpoint_store=None):
         with open(args.config_file, "r") as f:
             self.config = json.load(f)
 
         self.parallel_num = args.parallel_num
+        self.checkpoint_store = checkpoint_store
+        self.input_count = 0
+        # survey_id: title, completion is tracked by id since titles may repeat
+        self.resumed_surveys = {}
+        self.finished_ids = set()
+        self.failed_ids = set()
+        self.idle_since = None
         self.encode_pipeline = EncodePipeline(
-            self.config["encode"], args.data_num
+            self.config["encode"],
+            args.data_num,
+            checkpoint_store=checkpoint_store if args.resume else None,
         )
         self.hidden_pipeline = HiddenPipeline(
             self.config["hidden"],
@@ -50,25 +76,164 @@ class EntirePipeline(Pipeline):
             all_nodes, head=self.encode_pipeline, tail=self.decode_pipeline
         )
 
+        # stage name: node, a checkpointed survey is re-injected as the output of its stage
+        # in the order of progress inside a block cycle: skeleton_refine starts the next cycle, and
+        # a digest save comes after the output save of its cycle since its output also feeds the
+        # output node, while --output_each_block outputs do not go on to the next cycle
+        self.checkpoint_nodes = {
+            node.__name__: node
+            for node in [
+                self.hidden_pipeline.group_node,
+                self.hidden_pipeline.skeleton_init_node,
+                self.hidden_pipeline.skeleton_refine_node,
+                self.hidden_pipeline.output_node,
+                self.hidden_pipeline.digest_node,
+            ]
+        }
+        self.stage_ranks = {stage: rank for rank, stage in enumerate(self.checkpoint_nodes)}
+        if self.checkpoint_store is not None:
+            for stage, node in self.checkpoint_nodes.items():
+                node.add_put_decorator(self._checkpoint_decorator(stage))
+        self.decode_pipeline.save_node.add_proc_decorator(self._finish_decorator)
+        self.decode_pipeline.save_node.add_put_decorator(self._failure_decorator)
+
+    def put(self, data):
+        self.input_count += 1
+        super().put(data)
+
     def _connect_nodes(self):
         self.encode_pipeline >> self.hidden_pipeline >> self.decode_pipeline
 
+    def _checkpoint_decorator(self, stage):
+        def decorator(func):
+            @functools.wraps(func)
+            def checkpoint_wrapper(data):
+                if isinstance(data, Survey):
+                    # the output save of a block can come after the save of a later stage
+                    progress = (data.block_cycle_count, self.stage_ranks[stage])
+                    self.checkpoint_store.save(data, stage, progress)
+                return func(data)
+
+            return checkpoint_wrapper
+
+        return decorator
+
+    def _finish_decorator(self, func):
+        @functools.wraps(func)
+        def finish_wrapper(survey):
+            result = func(survey)
+            # with --output_each_block, intermediate blocks are saved as well
+            if survey.block_cycle_count >= self.hidden_pipeline.block_count:
+                self.finished_ids.add(survey_id_of(survey))
+                if self.checkpoint_store is not None:
+                    self.checkpoint_store.mark_finished(survey)
+            return result
+
+        return finish_wrapper
+
+    def _failure_decorator(self, func):
+        @functools.wraps(func)
+        def failure_wrapper(data):
+            # errors are forwarded down to the last node, where their survey is given up
+            if isinstance(data, NodeProcessingError):
+                if isinstance(data.data, Survey):
+                    failed_ids = {survey_id_of(data.data)}
+                else:
+                    # data of a module only knows the title of its survey
+                    title = get_survey_title([data.data])
+                    failed_ids = {
+                        survey_id
+                        for survey_id, survey_title in self.expected_surveys().items()
+                        if survey_title == title and survey_id not in self.finished_ids
+                    }
+                for survey_id in failed_ids - self.failed_ids:
+                    self.failed_ids.add(survey_id)
+                    logger.error(f"Survey {survey_id} failed in {data.func_name}.")
+            return func(data)
+
+        return failure_wrapper
+
+    def expected_surveys(self):
+        return {**self.encode_pipeline.loaded_surveys, **self.resumed_surveys}
+
+    def pending_ids(self):
+        return set(self.expected_surveys()) - self.finished_ids - self.failed_ids
 
-def start_pipeline(args):
+    def is_finished(self):
+        """Every input file is loaded, and every loaded or resumed survey is saved or failed."""
+        if self.encode_pipeline.loaded_file_count < self.input_count:
+            return False
+        return not self.pending_ids()
+
+    def is_idle(self):
+        """No node holds data, so the pending surveys were dropped and will never finish."""
+        if self.decode_pipeline.executing_survey:
+            return False
+
+        def iter_nodes(node_group):
+            for node in node_group.all_nodes.values():
+                if isinstance(node, Node):
+                    yield node
+                else:
+                    yield from iter_nodes(node)
+
+        return all(
+            node.src_queue.empty() and not node.executing_data for node in iter_nodes(self)
+        )
+
+    def check_idle(self, idle_timeout):
+        """Raise once the pipeline has stayed idle for idle_timeout seconds with surveys pending."""
+        if not self.is_idle():
+            self.idle_since = None
+            return
+        now = time.monotonic()
+        if self.idle_since is None:
+            self.idle_since = now
+        elif now - self.idle_since >= idle_timeout:
+            raise RuntimeError(
+                f"Pipeline idle for {idle_timeout}s, surveys {sorted(self.pending_ids())} will not finish."
+            )
+
+    def resume(self):
+        resume_count = 0
+        for payload in self.checkpoint_store.load_all():
+            if payload["stage"] == CheckpointStore.FINISHED_STAGE:
+                logger.info(f"Survey {payload['title']} already finished, skip resuming.")
+                continue
+            survey = payload["survey"]
+            logger.info(
+                f"Resume survey {survey.title} after stage {payload['stage']}, block cycle count {survey.block_cycle_count}"
+            )
+            self.checkpoint_nodes[payload["stage"]]._put_data(survey)
+            self.resumed_surveys[survey_id_of(survey)] = survey.title
+            resume_count += 1
+        logger.info(f"Resumed {resume_count} surveys from {self.checkpoint_store.checkpoint_dir}")
+
+
+def start_pipeline(args, checkpoint_store=None):
     httpx_logger = logging.getLogger("httpx")
     httpx_logger.setLevel(logging.WARNING)
     openai_logger = logging.getLogger("openai")
     openai_logger.setLevel(logging.WARNING)
 
     # start to write
-    pipeline = EntirePipeline(args)
+    pipeline = EntirePipeline(args, checkpoint_store)
 
     pipeline_analyser = PipelineAnalyser()
     pipeline_analyser.register(pipeline)
+    pipeline_analyser.register_usage(RequestWrapper.usage_tracker())
+
+    request_analyser = RequestAnalyser()
 
-    monitor = Monitor(report_interval=60)
-    monitor.register(pipeline_analyser)
+    monitor = Monitor(
+        report_interval=60,
+        metrics_port=args.metrics_port,
+        metrics_textfile=args.metrics_textfile,
+    )
+    monitor.register(pipeline_analyser, request_analyser)
     monitor.start()
+    # the monitor thread is a daemon, stop() writes the final metrics textfile on exit
+    atexit.register(monitor.stop)
 
     pipeline.start()
     return pipeline
@@ -83,21 +248,48 @@ async def main():
     
     logger.info(f"Start pipeline with args: {args}")
     logger.info(f"Current language: {os.environ.get('PROMPT_LANGUAGE', 'en')}")
-    if args.topic:
+    if args.cache_dir:
+        RequestWrapper.enable_cache(args.cache_dir)
+    with open(args.config_file, "r") as f:
+        RateLimiter.configure(json.load(f).get("rate_limit", {}))
+    checkpoint_store = CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None
+    if args.resume and checkpoint_store is None:
+        raise ValueError("--resume requires --checkpoint_dir to be set.")
+
+    if args.topic and args.resume and checkpoint_store.has(args.topic):
+        logger.info(f"Checkpoint of topic {args.topic} found, skip retrieving pages from Internet")
+        pipeline = start_pipeline(args, checkpoint_store)
+    elif args.topic:
         logger.info("set --topic, start to auto retrieve pages from Internet")
         # get retrieve urls
         logger.info("---------Start to generate queries.-------------")
-        retriever = LLM_search(model='deepseek-v3-0324', infer_type="OpenAI", engine='google', each_query_result=10)
+        search_cache = SearchCache(args.search_cache_dir) if args.search_cache_dir else None
+        retriever = LLM_search(model='deepseek-v3-0324', infer_type="OpenAI", engine='google', each_query_result=10, search_cache=search_cache, prefilter_top_k=args.snippet_prefilter_top_k)
         queries = retriever.get_queries(topic=args.topic, description=args.description)
         logger.info("---------Start to search pages.-------------")
         url_list = retriever.batch_web_search(queries=queries, topic=args.topic, top_n=int(args.top_n * 1.2))
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         # get references
         crawl_output_path = f"output/{args.topic}_{timestamp}_crawl_result.jsonl"
+        if args.resume:
+            # continue the latest interrupted crawl of the topic, see AsyncCrawler.run
+            partial_files = sorted(
+                glob.glob(f"output/{glob.escape(args.topic)}_*_crawl_result.jsonl.partial")
+            )
+            if partial_files:
+                crawl_output_path = partial_files[-1][: -len(".partial")]
+                logger.info(f"Resume the crawl of {crawl_output_path}")
         if not os.path.exists(os.path.dirname(crawl_output_path)):
             os.mkdir(os.path.dirname(crawl_output_path))
 
-        crawler = AsyncCrawler(model="deepseek-v3-0324", infer_type="OpenAI")
+        crawl_store = CrawlStore(args.crawl_store_dir) if args.crawl_store_dir else None
+        crawler = AsyncCrawler(
+            model="deepseek-v3-0324",
+            infer_type="OpenAI",
+            crawl_store=crawl_store,
+            prefilter_top_k=args.page_prefilter_top_k,
+            dedup_threshold=args.dedup_threshold,
+        )
         max_retries = 3
         retry_delay = 1  # seconds
         
@@ -117,17 +309,30 @@ async def main():
                 logger.warning(f"Attempt {attempt + 1} failed, retrying in {retry_delay * (attempt + 1)} seconds... Error: {str(e)}")
                 await asyncio.sleep(retry_delay * (attempt + 1))  # Exponential backoff
         print("---------References retrieve end.-------------")
-        pipeline = start_pipeline(args)
+        pipeline = start_pipeline(args, checkpoint_store)
         pipeline.put(crawl_output_path)
     elif args.input_file:
         logger.info("set --input_file, start to process the input file")
-        pipeline = start_pipeline(args)
+        pipeline = start_pipeline(args, checkpoint_store)
         pipeline.put(args.input_file)
     else:
         raise ValueError("Either --topic or --input_file should be set.")
 
-    while True:
+    if args.resume:
+        pipeline.resume()
+
+    usage_file = args.usage_file or os.path.splitext(args.output_file)[0] + "_usage.json"
+    usage_tracker = RequestWrapper.usage_tracker()
+    atexit.register(usage_tracker.dump, usage_file)
+    logger.info(f"LLM usage statistics will be dumped to {usage_file}")
+    while not (args.exit_on_finish and pipeline.is_finished()):
         gevent.sleep(5)
+        usage_tracker.dump(usage_file)
+        if args.exit_on_finish and pipeline.encode_pipeline.loaded_file_count >= pipeline.input_count:
+            pipeline.check_idle(args.idle_timeout)
+    logger.info(
+        f"All surveys done, {len(pipeline.finished_ids)} finished, {len(pipeline.failed_ids)} failed."
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import re
+import math
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# latin words and digits, CJK characters one by one
+TOKEN_REG = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+def tokenize(text):
+    return TOKEN_REG.findall(text.lower())
+
+
+class BM25:
+    """Okapi BM25 over a small in-memory corpus, used to rank candidates before LLM scoring."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_freqs = [Counter(tokenize(document)) for document in documents]
+        self.doc_lens = [sum(freqs.values()) for freqs in self.doc_freqs]
+        self.avg_doc_len = sum(self.doc_lens) / len(self.doc_lens) if self.doc_lens else 0
+
+        doc_count = Counter()
+        for freqs in self.doc_freqs:
+            doc_count.update(freqs.keys())
+        corpus_size = len(self.doc_freqs)
+        self.idf = {
+            term: math.log(1 + (corpus_size - count + 0.5) / (count + 0.5))
+            for term, count in doc_count.items()
+        }
+
+    def scores(self, query):
+        query_terms = set(tokenize(query))
+        scores = []
+        for freqs, doc_len in zip(self.doc_freqs, self.doc_lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * doc_len / (self.avg_doc_len or 1))
+            for term in query_terms:
+                freq = freqs.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+
+def bm25_prefilter(query, documents, top_k):
+    """
+    Rank documents by BM25 against the query and keep the top_k.
+
+    Returns:
+        list: (index, rank, score) of the kept documents, best first
+    """
+    scores = BM25(documents).scores(query)
+    ranking = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+    kept = [(index, rank, scores[index]) for rank, index in enumerate(ranking[:top_k])]
+    if kept:
+        logger.info(
+            f"BM25 pre-filter kept {len(kept)}/{len(documents)} candidates, cutoff score {kept[-1][2]:.3f}, "
+            f"{sum(1 for score in scores if score == 0)} candidates share no term with the query"
+        )
+    return kept
+
+
+def log_prefilter_recall(stage_name, selected_ranks, top_k):
+    """
+    Log how deep in the BM25 ranking the candidates finally selected by the LLM were found. When the
+    deepest one is close to top_k, relevant candidates were probably cut and top_k should be raised.
+    """
+    if not selected_ranks:
+        logger.info(f"{stage_name} BM25 pre-filter: no candidate selected")
+        return
+    deepest_rank = max(selected_ranks) + 1
+    in_last_quarter = sum(1 for rank in selected_ranks if rank >= top_k * 0.75)
+    logger.info(
+        f"{stage_name} BM25 pre-filter: deepest selected rank {deepest_rank}/{top_k}, "
+        f"{in_last_quarter}/{len(selected_ranks)} selected candidates in the last quarter of the cutoff"
+    )
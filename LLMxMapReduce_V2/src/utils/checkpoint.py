@@ -0,0 +1,99 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """
+    Persist the latest Survey state of every survey between pipeline stages.
+
+    One file per survey title holds the name of the last completed stage (the node that
+    produced the survey) and the pickled Survey, so a crashed run can re-inject the survey
+    right after that stage instead of starting again from EncodePipeline.
+    """
+
+    FINISHED_STAGE = "finished"
+    FINISHED_PROGRESS = (float("inf"),)
+
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self._lock = Semaphore(1)
+        self._progress = {}  # title: progress of its saved checkpoint
+
+    def save(self, survey, stage, progress=None):
+        """
+        progress: comparable position of the stage in the pipeline, the save is skipped if the
+        checkpoint of the survey is further. None always saves.
+        """
+        payload = {
+            "title": survey.title,
+            "stage": stage,
+            "progress": progress,
+            "saved_at": time.time(),
+            "survey": survey if stage != self.FINISHED_STAGE else None,
+        }
+        path = self._path(survey.title)
+        try:
+            with self._lock:
+                saved_progress = self._progress.get(survey.title)
+                if progress is not None and saved_progress is not None and progress < saved_progress:
+                    logger.info(
+                        f"Checkpoint skipped: Survey {survey.title}, stage {stage}, a later stage is saved"
+                    )
+                    return
+                data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+                self._progress[survey.title] = progress
+            logger.info(
+                f"Checkpoint saved: Survey {survey.title}, stage {stage}, block cycle count {survey.block_cycle_count}"
+            )
+        except Exception as e:
+            logger.warning(f"Checkpoint save failed: Survey {survey.title}, stage {stage}: {e}")
+
+    def mark_finished(self, survey):
+        self.save(survey, self.FINISHED_STAGE, self.FINISHED_PROGRESS)
+
+    def load(self, title):
+        path = self._path(title)
+        if not os.path.exists(path):
+            return None
+        return self._load_file(path)
+
+    def load_all(self):
+        for file_name in sorted(os.listdir(self.checkpoint_dir)):
+            if not file_name.endswith(".pkl"):
+                continue
+            payload = self._load_file(os.path.join(self.checkpoint_dir, file_name))
+            if payload is not None:
+                self._progress[payload["title"]] = payload.get("progress")
+                yield payload
+
+    def has(self, title):
+        return os.path.exists(self._path(title))
+
+    def _load_file(self, path):
+        try:
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Checkpoint load failed: {path}: {e}")
+            return None
+
+        survey = payload["survey"]
+        if survey is not None:
+            # do not count the downtime between crash and resume into the survey cost time
+            survey.cost_time += payload["saved_at"] - survey.start_time
+            survey.start_time = time.time()
+        return payload
+
+    def _path(self, title):
+        file_name = hashlib.md5(title.encode("utf-8")).hexdigest() + ".pkl"
+        return os.path.join(self.checkpoint_dir, file_name)
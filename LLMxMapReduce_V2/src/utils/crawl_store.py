@@ -0,0 +1,101 @@
+import os
+import time
+import sqlite3
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAM_PREFIXES = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url):
+    """Lowercase scheme and host, drop default ports, fragments, tracking params and trailing slashes, sort the query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ""
+    if parts.port and not (
+        (scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)
+    ):
+        netloc += f":{parts.port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+class CrawlStore:
+    """
+    Local store of crawled pages keyed by normalized URL.
+
+    Keeps the raw markdown with the fetch time and the ETag/Last-Modified validators of the
+    response, so a repeated topic can reuse fresh pages and only revalidate stale ones.
+    """
+
+    DB_NAME = "crawl_store.sqlite"
+
+    def __init__(self, store_dir, max_age=7 * 24 * 3600):
+        os.makedirs(store_dir, exist_ok=True)
+        self.db_path = os.path.join(store_dir, self.DB_NAME)
+        self.max_age = max_age
+        self.hit_count = 0
+        self.revalidated_count = 0
+        self.miss_count = 0
+
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, origin_url TEXT NOT NULL, raw_markdown TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, etag TEXT, last_modified TEXT)"
+        )
+        logger.info(f"Crawl store enabled at {self.db_path}")
+
+    def get(self, url):
+        row = self._conn.execute(
+            "SELECT raw_markdown, fetched_at, etag, last_modified FROM pages WHERE url = ?",
+            (normalize_url(url),),
+        ).fetchone()
+        if row is None:
+            return None
+        raw_markdown, fetched_at, etag, last_modified = row
+        return {
+            "raw_markdown": raw_markdown,
+            "fetched_at": fetched_at,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": time.time() - fetched_at < self.max_age,
+        }
+
+    def put(self, url, raw_markdown, headers=None):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pages (url, origin_url, raw_markdown, fetched_at, etag, last_modified) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                normalize_url(url),
+                url,
+                raw_markdown,
+                time.time(),
+                headers.get("etag"),
+                headers.get("last-modified"),
+            ),
+        )
+
+    def touch(self, url):
+        # the page was revalidated (304), it is fresh again
+        self._conn.execute(
+            "UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), normalize_url(url))
+        )
+
+    def stats(self):
+        return {
+            "hit": self.hit_count,
+            "revalidated": self.revalidated_count,
+            "miss": self.miss_count,
+        }
@@ -0,0 +1,98 @@
+import zlib
+import logging
+import numpy as np
+from src.utils.bm25 import tokenize
+
+logger = logging.getLogger(__name__)
+
+# a * h + b stays below 2 ** 64 for 32 bit a, b and h, so the permutations never overflow uint64
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text, size=5):
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of word shingles with LSH banding, to find documents whose estimated
+    Jaccard similarity with an already indexed one reaches threshold.
+
+    Documents with less than min_shingles shingles (error pages, stubs) are never matched.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, min_shingles=20, seed=1):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_shingles = min_shingles
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def signature(self, text):
+        document_shingles = shingles(text)
+        if len(document_shingles) < self.min_shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in document_shingles),
+            dtype=np.uint64,
+            count=len(document_shingles),
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature):
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def query(self, text, signature=None):
+        """
+        Returns:
+            list: (key, estimated Jaccard similarity) of the indexed near-duplicates, most similar first
+        """
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return []
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        matches = []
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def add(self, key, text, signature=None):
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return
+        self._signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def add_unique(self, key, text):
+        """
+        Index the document unless it is a near-duplicate of an indexed one.
+
+        Returns:
+            list: (key, estimated Jaccard similarity) of the near-duplicates, empty if the document was indexed
+        """
+        signature = self.signature(text)
+        matches = self.query(text, signature)
+        if not matches:
+            self.add(key, text, signature)
+        return matches
@@ -1,6 +1,7 @@
 import re
 import logging
 from difflib import SequenceMatcher
+from functools import lru_cache
 from src.exceptions import MdNotFoundError, BibkeyNotFoundError
 
 logger = logging.getLogger(__name__)
@@ -41,84 +42,119 @@ def list2str(str_list):
     else:
         return "[" + ", ".join(str_list) + "]"
     
-def remove_illegal_bibkeys(content, legal_bibkeys, raise_error=False, raise_warning=True):
-    def get_rest_bibkeys(content, references_reg):
-        current_bibkeys = set()
-        for match in references_reg.finditer(content):
-            bibkey_str = match.group(1)
-            bibkey_list = str2list(bibkey_str)
-            for bibkey in bibkey_list:
-                current_bibkeys.add(bibkey.strip())
+BLOCK_MATH_REG = re.compile(r"\$\$[^\$]+\$\$")
+INLINE_MATH_REG = re.compile(r"\$[^\$]+\$")
+REFERENCES_REG = re.compile(r"(\[.*?\])", re.DOTALL)
+EMPTY_REFERENCE_REG = re.compile(r"\[\s*\]")
+FUZZY_MATCH_RATIO = 0.8
+
+
+class BibkeyMatcher:
+    """
+    Find the first legal bibkey whose SequenceMatcher ratio with a given key is above FUZZY_MATCH_RATIO.
+
+    Legal bibkeys are bucketed by length: since ratio <= 2 * min(la, lb) / (la + lb), only the
+    buckets that can pass are compared, then quick_ratio() (an upper bound as well) skips most of
+    the remaining full ratio() computations. One SequenceMatcher is kept per legal bibkey as seq2,
+    so its index is built once. The result is the same as scanning every legal bibkey.
+    """
+
+    def __init__(self, legal_bibkeys):
+        self.legal_bibkeys = list(legal_bibkeys)
+        self._by_length = {}
+        for order, bibkey in enumerate(self.legal_bibkeys):
+            self._by_length.setdefault(len(bibkey), []).append(order)
+        self._matchers = {}
+
+    def match(self, bibkey):
+        length = len(bibkey)
+        candidates = []
+        for legal_length, orders in self._by_length.items():
+            if 2 * min(length, legal_length) > FUZZY_MATCH_RATIO * (length + legal_length):
+                candidates.extend(orders)
+        for order in sorted(candidates):
+            matcher = self._matchers.get(order)
+            if matcher is None:
+                matcher = self._matchers[order] = SequenceMatcher(None, b=self.legal_bibkeys[order])
+            matcher.set_seq1(bibkey)
+            if matcher.quick_ratio() > FUZZY_MATCH_RATIO and matcher.ratio() > FUZZY_MATCH_RATIO:
+                return self.legal_bibkeys[order]
+        return None
+
+
+@lru_cache(maxsize=64)
+def get_bibkey_matcher(legal_bibkeys):
+    # the same legal bibkeys (all digests of a survey) are checked again for every section
+    return BibkeyMatcher(legal_bibkeys)
 
-        rest_bibkeys = current_bibkeys - set(legal_bibkeys)
-        return rest_bibkeys
 
+def remove_illegal_bibkeys(content, legal_bibkeys, raise_error=False, raise_warning=True):
     # 保存数学公式
     math_placeholders = {}
-    math_count = 0
-    
-    # 处理块级公式
-    block_math_pattern = r'\$\$[^\$]+\$\$'
-    for match in re.finditer(block_math_pattern, content):
-        placeholder = f'MATH_PLACEHOLDER_{math_count}'
-        math_placeholders[placeholder] = match.group(0)
-        content = content.replace(match.group(0), placeholder)
-        math_count += 1
-    
-    # 处理行内公式
-    inline_math_pattern = r'\$[^\$]+\$'
-    for match in re.finditer(inline_math_pattern, content):
-        placeholder = f'MATH_PLACEHOLDER_{math_count}'
+    placeholder_by_math = {}
+
+    def protect_math(match):
+        # 相同的公式共用第一个占位符
+        placeholder = f"MATH_PLACEHOLDER_{len(math_placeholders)}"
         math_placeholders[placeholder] = match.group(0)
-        content = content.replace(match.group(0), placeholder)
-        math_count += 1
-    
-    # 原有的引用处理逻辑
-    references_reg = re.compile(r"(\[.*?\])", re.DOTALL)
-    content = references_reg.sub(lambda m: m.group(0).replace("-", "_").replace("'", "'").replace("'", "'"), content)
-    
-    rest_bibkeys = get_rest_bibkeys(content, references_reg)
-    
-    for rest_bibkey in list(rest_bibkeys):
-        for legal_bibkey in legal_bibkeys:
-            if SequenceMatcher(None, rest_bibkey, legal_bibkey).ratio() > 0.8:
-                content = content.replace(rest_bibkey, legal_bibkey)
-                rest_bibkeys.remove(rest_bibkey)
-                break
-    
+        return placeholder_by_math.setdefault(match.group(0), placeholder)
+
+    # 先处理块级公式, 再处理行内公式
+    content = BLOCK_MATH_REG.sub(protect_math, content)
+    content = INLINE_MATH_REG.sub(protect_math, content)
+
+    # 规范引用, 同时把能模糊匹配到合法 bibkey 的引用修正过来, 剩下的就是非法 bibkey
+    legal_bibkey_set = set(legal_bibkeys)
+    repaired_bibkeys = {}
+    rest_bibkeys = set()
+    matcher = None
+
+    def normalize_reference(match):
+        nonlocal matcher
+        reference = match.group(0).replace("-", "_")
+        references = str2list(reference)
+        repaired = False
+        for i, bibkey in enumerate(references):
+            if bibkey in legal_bibkey_set:
+                continue
+            if bibkey not in repaired_bibkeys:
+                if matcher is None:
+                    matcher = get_bibkey_matcher(tuple(legal_bibkeys))
+                repaired_bibkeys[bibkey] = matcher.match(bibkey)
+            if repaired_bibkeys[bibkey] is None:
+                rest_bibkeys.add(bibkey)
+            else:
+                references[i] = repaired_bibkeys[bibkey]
+                repaired = True
+        return list2str(references) if repaired else reference
+
+    content = REFERENCES_REG.sub(normalize_reference, content)
+
     if rest_bibkeys and raise_error:
         raise BibkeyNotFoundError(bibkeys=rest_bibkeys, content=content, legal_bibkeys=legal_bibkeys)
     elif rest_bibkeys:
         if raise_warning:
             logger.warning(f"Remove illegal bibkeys: {rest_bibkeys}, \nall legal bibkeys: {legal_bibkeys}")
-        ref_lists = references_reg.findall(content)
-        if ref_lists:
-            for ref_str in set(ref_lists):
-                ref_result = str2list(ref_str)
-                for ref in ref_result[:]:
-                    if ref in rest_bibkeys:
-                        ref_result.remove(ref)
-                ref_result = list(set(ref_result))
-                content = content.replace(ref_str, list2str(ref_result))
-    
+
+        def remove_rest_bibkeys(match):
+            references = [ref for ref in str2list(match.group(0)) if ref not in rest_bibkeys]
+            return list2str(dict.fromkeys(references))
+
+        content = REFERENCES_REG.sub(remove_rest_bibkeys, content)
+
     content = process_bibkeys(content)
-    
-    # 还原数学公式
-    for placeholder, math_content in math_placeholders.items():
-        content = content.replace(placeholder, math_content)
-    
+
+    # 还原数学公式, 长的占位符优先, 避免 MATH_PLACEHOLDER_1 匹配到 MATH_PLACEHOLDER_10 的前缀
+    if math_placeholders:
+        placeholder_reg = re.compile(
+            "|".join(map(re.escape, sorted(math_placeholders, key=len, reverse=True)))
+        )
+        content = placeholder_reg.sub(lambda match: math_placeholders[match.group(0)], content)
     return content
 
 def process_bibkeys(raw_content):
-    raw_content = re.sub(r'\[\s*\]', '', raw_content)
-    references_reg = re.compile(r"(\[.*?\])", re.DOTALL)
-    bibkeys = references_reg.findall(raw_content)
-    bibkeys = set([bibkey for bibkey in bibkeys])
-    for bibkey in bibkeys:
-        new_bibkey = list2str(str2list(bibkey))
-        if new_bibkey != bibkey:
-            raw_content = raw_content.replace(bibkey, new_bibkey)
-    return raw_content
+    raw_content = EMPTY_REFERENCE_REG.sub("", raw_content)
+    return REFERENCES_REG.sub(lambda match: list2str(str2list(match.group(0))), raw_content)
 
 def remove_brackets_and_content(text):
     # Use regex to match brackets and their content
@@ -0,0 +1,67 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from gevent.lock import Semaphore
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCache:
+    """
+    Persistent cache of web search results, keyed by (backend, query, search parameters).
+
+    Entries older than ttl seconds are ignored and replaced by the next search of the query.
+    """
+
+    DB_NAME = "search_cache.sqlite"
+
+    def __init__(self, cache_dir, ttl=24 * 3600):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, self.DB_NAME)
+        self.ttl = ttl
+        self.hit_count = 0
+        self.miss_count = 0
+        self._lock = Semaphore(1)
+
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, query TEXT NOT NULL, results TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        logger.info(f"Search cache enabled at {self.db_path}")
+
+    @staticmethod
+    def make_key(backend, query, params):
+        payload = json.dumps(
+            {"backend": backend, "query": query.strip(), "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] >= self.ttl:
+                self.miss_count += 1
+                return None
+            self.hit_count += 1
+            return json.loads(row[0])
+
+    def put(self, key, query, results):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, query, results, created) VALUES (?, ?, ?, ?)",
+                (key, query, json.dumps(results, ensure_ascii=False), time.time()),
+            )
+
+    def stats(self):
+        return {"hit": self.hit_count, "miss": self.miss_count}